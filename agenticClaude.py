@@ -1,44 +1,48 @@
 from datetime import datetime
 from zoneinfo import ZoneInfo
-import anthropic
-import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+import clients
 
 def get_current_time(timezone):
     """Returns current time for the given time zone"""
     timezone = ZoneInfo(timezone)
     return datetime.now(timezone).strftime("%H:%M:%S")
 
-# Use Anthropic's official SDK
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# Tool schema shared by both requests
+TOOLS = [{
+    "name": "get_current_time",
+    "description": "Returns current time for the given time zone",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "timezone": {
+                "type": "string",
+                "description": "The IANA timezone name (e.g., 'America/New_York')"
+            }
+        },
+        "required": ["timezone"]
+    }
+}]
+
+client = clients.ANTHROPIC
+MODEL = "claude-sonnet-4-5-20250929"
+
+def _call(messages):
+    """Send one turn. Tools are always declared: the API rejects requests whose
+    messages contain tool_use/tool_result blocks without a tool definition."""
+    return client.messages.create(
+        model=MODEL,
+        max_tokens=1024,
+        tools=TOOLS,
+        messages=messages
+    )
 
 messages = [
     {"role": "user", "content": "What time is it in New York right now?"}
 ]
 
 print("Sending initial request to Claude...")
-response = client.messages.create(
-    model="claude-sonnet-4-5-20250929",
-    max_tokens=1024,
-    tools=[{
-        "name": "get_current_time",
-        "description": "Returns current time for the given time zone",
-        "input_schema": {
-            "type": "object",
-            "properties": {
-                "timezone": {
-                    "type": "string",
-                    "description": "The IANA timezone name (e.g., 'America/New_York')"
-                }
-            },
-            "required": ["timezone"]
-        }
-    }],
-    messages=messages
-)
+response = _call(messages)
 
 print(f"\nClaude's response: {response}")
 print(f"\nStop reason: {response.stop_reason}")
@@ -68,27 +72,9 @@ if response.stop_reason == "tool_use":
     
     # Get Claude's final response
     print("\nSending tool result back to Claude...")
-    final_response = client.messages.create(
-        model="claude-sonnet-4-5-20250929",
-        max_tokens=1024,
-        tools=[{
-            "name": "get_current_time",
-            "description": "Returns current time for the given time zone",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "timezone": {
-                        "type": "string",
-                        "description": "The IANA timezone name (e.g., 'America/New_York')"
-                    }
-                },
-                "required": ["timezone"]
-            }
-        }],
-        messages=messages
-    )
+    final_response = _call(messages)
     
     print(f"\nClaude's final answer:")
     for block in final_response.content:
-        if hasattr(block, "text"):
+        if block.type == "text":
             print(block.text)
\ No newline at end of file
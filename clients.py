@@ -0,0 +1,79 @@
+"""
+clients.py
+Shared Anthropic clients for the agentic labs.
+
+Every module uses the same client instead of constructing its own, and the
+client is backed by a pooled HTTP/2 connection, so consecutive agent turns
+(and concurrent ones) reuse one TCP+TLS connection instead of handshaking
+again.
+
+``MODEL_TIERS`` routes each kind of call to the cheapest model that handles
+it well: light rewrites and tool dispatch go to Haiku, vision to Sonnet.
+``response_text`` extracts the text of a response for every agent loop, and
+``today`` is the date the research prompts mention. ``tavily_client`` hands
+out the search client shared by both research tool modules.
+"""
+
+import functools
+import os
+import time
+from datetime import datetime
+
+import anthropic
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection pool shared by all requests of a client; idle connections are
+# kept for a minute so agent turns separated by tool calls still reuse them
+_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60)
+
+# DefaultHttpxClient keeps the SDK's default timeouts and redirect handling
+ANTHROPIC = anthropic.Anthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=anthropic.DefaultHttpxClient(http2=True, limits=_LIMITS),
+)
+
+# Async variant for asyncio-based agents
+ANTHROPIC_ASYNC = anthropic.AsyncAnthropic(
+    api_key=os.getenv("ANTHROPIC_API_KEY"),
+    http_client=anthropic.DefaultAsyncHttpxClient(http2=True, limits=_LIMITS),
+)
+
+@functools.lru_cache(maxsize=4)
+def tavily_client(api_key: str, api_base_url: str | None = None):
+    """One TavilyClient per (api_key, base_url), reused across searches."""
+    from tavily import TavilyClient  # Only the research tools need it
+
+    return TavilyClient(api_key=api_key, api_base_url=api_base_url)
+
+
+# Model routing: agents default to a tier, callers can still pass ``model=``
+MODEL_TIERS = {
+    "fast": "claude-haiku-4-5-20251001",    # Short rewrites, tool dispatch
+    "default": "claude-sonnet-4-20250514",  # General generation
+    "vision": "claude-sonnet-4-20250514",   # Image understanding
+}
+
+
+def response_text(content) -> str:
+    """Concatenated text blocks of a response (a lone text block is returned as-is)."""
+    if len(content) == 1 and content[0].type == "text":
+        return content[0].text
+    return "".join(block.text for block in content if getattr(block, "type", None) == "text")
+
+
+@functools.lru_cache(maxsize=1)
+def _today(bucket: int) -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def today() -> str:
+    """
+    Today's date as YYYY-MM-DD, formatted once per epoch hour.
+
+    An hour rather than a UTC day, so the local date rolls over at local
+    midnight for whole-hour UTC offsets.
+    """
+    return _today(int(time.time()) // 3600)
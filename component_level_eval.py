@@ -2,27 +2,33 @@
 # Converted from OpenAI to use Anthropic's Claude API
 # FIXED: Proper tool definitions for Anthropic
 
-from datetime import datetime
-import json
+from concurrent.futures import ThreadPoolExecutor
+import atexit
+import functools
+import hashlib
+import io
 import re
+import threading
+import time
+from types import MappingProxyType
+from urllib.parse import urlsplit
 
-from anthropic import Anthropic
+import orjson
 
 # Import your research tools
+import clients
+import llm_cache
 import research_tools
+import semantic_cache
 import utils
 
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+client = clients.ANTHROPIC
 
 # =========================
 # Tool Definitions for Anthropic
 # =========================
 
-RESEARCH_TOOLS = [
+_RAW_RESEARCH_TOOLS = [
     {
         "name": "arxiv_search",
         "description": "Search arXiv for academic papers on a given topic",
@@ -77,10 +83,90 @@ RESEARCH_TOOLS = [
     }
 ]
 
+# Built once and frozen: the same object is passed to every messages.create
+# call, and nothing can mutate (or needs to defensively copy) it.
+RESEARCH_TOOLS = tuple(MappingProxyType(t) for t in _RAW_RESEARCH_TOOLS)
+
+
+# =========================
+# Tool Execution (memoized)
+# =========================
+
+# Agentic workloads re-issue the same tool call often; results are memoized
+# in-process (LRU) and across sessions (disk) keyed on the canonical input.
+_TOOL_CACHE_DIR = ".tool_cache"
+# Search results go stale ("recent papers"), so disk entries expire
+_TOOL_CACHE_TTL = 6 * 3600
+_DUPLICATE_RATE_THRESHOLD = 0.4
+_tool_stats = {"calls": 0, "hits": 0}
+_tool_stats_lock = threading.Lock()
+# Set by _do_call's body, so a call that leaves it False was an LRU hit
+_tool_call_ran = threading.local()
+
+
+def _count_tool(name: str) -> None:
+    with _tool_stats_lock:
+        _tool_stats[name] += 1
+
+
+class _ToolError(Exception):
+    """Raised from the memoized helper so error results are never cached."""
+
+
+@functools.lru_cache(maxsize=1)
+def _tool_backend():
+    return llm_cache.open_backend(_TOOL_CACHE_DIR)
+
+
+def _is_error_result(result) -> bool:
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, list):
+        return any(isinstance(r, dict) and "error" in r for r in result)
+    return False
+
+
+def _execute_tool(tool_name: str, tool_input: dict) -> str:
+    if tool_name == "arxiv_search":
+        # Call your arxiv tool from research_tools
+        result = research_tools.arxiv_search(**tool_input)
+    elif tool_name == "tavily_search":
+        # Call your tavily tool from research_tools
+        result = research_tools.tavily_search(**tool_input)
+    elif tool_name == "wikipedia_search":
+        # Call your wikipedia tool from research_tools
+        result = research_tools.wikipedia_search(**tool_input)
+    else:
+        raise _ToolError(f"Unknown tool: {tool_name}")
+
+    if _is_error_result(result):
+        raise _ToolError(orjson.dumps(result).decode())
+    return orjson.dumps(result).decode() if not isinstance(result, str) else result
+
+
+@functools.lru_cache(maxsize=1024)
+def _do_call(tool_name: str, frozen_input: str) -> str:
+    _tool_call_ran.value = True
+    key = hashlib.sha256((tool_name + frozen_input).encode("utf-8")).hexdigest()
+    backend = _tool_backend()
+    if backend is not None:
+        cached = backend.get(key)
+        if cached is not None:
+            _count_tool("hits")
+            return cached.decode("utf-8")
+
+    result = _execute_tool(tool_name, orjson.loads(frozen_input))
+    if backend is not None:
+        backend.set(key, result.encode("utf-8"), expire=_TOOL_CACHE_TTL)
+    return result
+
 
 def process_tool_call(tool_name: str, tool_input: dict):
     """
     Execute a tool call and return the result.
+
+    Successful results are memoized on ``(tool_name, canonical(tool_input))``;
+    errors are returned to the model but never cached.
     
     Args:
         tool_name (str): Name of the tool to call
@@ -89,29 +175,74 @@ def process_tool_call(tool_name: str, tool_input: dict):
     Returns:
         str: Result from the tool
     """
+    _count_tool("calls")
+    _tool_call_ran.value = False
     try:
-        if tool_name == "arxiv_search":
-            # Call your arxiv tool from research_tools
-            result = research_tools.arxiv_search(**tool_input)
-        elif tool_name == "tavily_search":
-            # Call your tavily tool from research_tools
-            result = research_tools.tavily_search(**tool_input)
-        elif tool_name == "wikipedia_search":
-            # Call your wikipedia tool from research_tools
-            result = research_tools.wikipedia_search(**tool_input)
-        else:
-            result = f"Unknown tool: {tool_name}"
-        
-        return json.dumps(result) if not isinstance(result, str) else result
-    
+        result = _do_call(tool_name, orjson.dumps(tool_input, option=orjson.OPT_SORT_KEYS).decode())
+    except _ToolError as e:
+        return str(e)
     except Exception as e:
         return f"Tool error ({tool_name}): {str(e)}"
 
+    if not _tool_call_ran.value:
+        _count_tool("hits")
+    return result
+
+
+@atexit.register
+def _report_tool_cache() -> None:
+    calls = _tool_stats["calls"]
+    if calls and _tool_stats["hits"] / calls > _DUPLICATE_RATE_THRESHOLD:
+        print(f"\n🔁 Tool cache: {_tool_stats['hits']}/{calls} calls were duplicates "
+              f"({_tool_stats['hits'] / calls:.0%}) and served from cache")
+
+
+_TOOL_WORKERS = 8
+
+
+def _stream_turn(executor, **kwargs):
+    """
+    Stream one Claude turn and submit each ``tool_use`` block to ``executor``
+    as soon as the block is complete, overlapping tool latency with the rest
+    of Claude's decoding.
+
+    Args:
+        executor (ThreadPoolExecutor): Pool running ``process_tool_call``
+        **kwargs: Arguments for ``messages.stream``
+
+    Returns:
+        tuple: (response, [(tool_use_block, future), ...]) in block order
+    """
+    pending = []
+
+    def on_block(block):
+        if block.type == "tool_use":
+            pending.append((block, executor.submit(process_tool_call, block.name, block.input)))
+
+    response = llm_cache.cached_messages_stream(client, on_block=on_block, **kwargs)
+    return response, pending
+
+
+def _result_signature(tool_name: str, tool_input: dict, result: str) -> str:
+    """Fingerprint of a tool call and (the head of) its result."""
+    payload = tool_name + orjson.dumps(tool_input, option=orjson.OPT_SORT_KEYS).decode() + result[:1024]
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _log_iteration(iteration: int, started: float, response) -> None:
+    usage = response.usage
+    print(f"   ↻ iteration {iteration}: {time.perf_counter() - started:.1f}s, "
+          f"{usage.input_tokens} input / {usage.output_tokens} output tokens")
+
 
 # =========================
 # Research Step – `find_references`
 # =========================
 
+# Near-identical tasks ("Research X" / "Look up X research") reuse one answer
+_SEMANTIC_CACHE = semantic_cache.SemanticCache(threshold=0.92)
+
+
 def find_references(task: str, model: str = "claude-opus-4-1", return_messages: bool = False):
     """
     Perform a research task using external tools (arxiv, tavily, wikipedia).
@@ -136,65 +267,80 @@ You are a research assistant with access to:
 Task:
 {task}
 
-Today is {datetime.now().strftime('%Y-%m-%d')}.
+Today is {clients.today()}.
 
 Please use the available tools to research this topic thoroughly and provide a comprehensive answer with URLs and citations.
 """.strip()
 
     messages = [{"role": "user", "content": prompt}]
 
-    try:
-        # Initialize conversation
-        response = client.messages.create(
-            model=model,
-            max_tokens=4096,
-            tools=RESEARCH_TOOLS,
-            messages=messages,
-        )
+    # Semantic cache: embed the task once, reuse a prior answer if it is close enough
+    # (embed returns None if the encoder is unavailable, which just disables it)
+    task_embedding = semantic_cache.embed([task])
+    cached = _SEMANTIC_CACHE.search(task_embedding, model)
+    if cached is not None:
+        content, cached_messages = cached
+        return (content, cached_messages) if return_messages else content
 
-        # Agentic loop to handle tool calls
-        max_iterations = 5
-        iteration = 0
-
-        while response.stop_reason == "tool_use" and iteration < max_iterations:
-            iteration += 1
-            
-            # Add assistant's response to messages
-            messages.append({"role": "assistant", "content": response.content})
-            
-            # Process each tool call
-            tool_results = []
-            for block in response.content:
-                if block.type == "tool_use":
-                    tool_name = block.name
-                    tool_input = block.input
-                    
-                    # Execute the tool
-                    tool_result = process_tool_call(tool_name, tool_input)
-                    
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": tool_result,
-                    })
-            
-            # Add tool results to messages
-            messages.append({"role": "user", "content": tool_results})
-            
-            # Get next response
-            response = client.messages.create(
-                model=model,
-                max_tokens=4096,
-                tools=RESEARCH_TOOLS,
-                messages=messages,
-            )
+    # Everything but the messages is identical on every turn
+    request = {"model": model, "max_tokens": 4096, "tools": RESEARCH_TOOLS}
+
+    try:
+        with ThreadPoolExecutor(max_workers=_TOOL_WORKERS) as executor:
+            # Initialize conversation
+            started = time.perf_counter()
+            response, pending = _stream_turn(executor, messages=messages, **request)
+
+            _log_iteration(0, started, response)
+
+            # Agentic loop to handle tool calls
+            max_iterations = 5
+            iteration = 0
+            seen_results: set[str] = set()
+
+            while response.stop_reason == "tool_use" and iteration < max_iterations:
+                iteration += 1
+                
+                # Tool calls were dispatched while streaming; collect in order
+                tool_results = []
+                new_information = False
+                for block, future in pending:
+                    result = future.result()
+                    signature = _result_signature(block.name, block.input, result)
+                    if signature not in seen_results:
+                        seen_results.add(signature)
+                        new_information = True
+                    tool_results.append({"type": "tool_result", "tool_use_id": block.id, "content": result})
+                
+                # Add assistant's response and tool results to messages
+                messages.append({"role": "assistant", "content": response.content})
+                messages.append({"role": "user", "content": tool_results})
+                
+                # Converged: Claude only re-issued calls it already has the
+                # answers to, so more tool rounds would not add anything;
+                # one last turn with tools disabled writes the answer
+                converged = not new_information
+                if converged:
+                    print(f"   ✓ converged after {iteration - 1} tool iteration(s): repeated tool calls only")
+                
+                # Get next response
+                started = time.perf_counter()
+                response, pending = _stream_turn(
+                    executor,
+                    messages=messages,
+                    **request,
+                    **({"tool_choice": {"type": "none"}} if converged else {})
+                )
+                _log_iteration(iteration, started, response)
+                if converged:
+                    break
 
         # Extract final text content
-        content = ""
-        for block in response.content:
-            if hasattr(block, "text"):
-                content += block.text
+        content = clients.response_text(response.content)
 
+        # Only a finished, non-empty answer is worth serving to similar tasks
+        if response.stop_reason == "end_turn" and content.strip():
+            _SEMANTIC_CACHE.add(task_embedding, task, model, (content, messages))
         return (content, messages) if return_messages else content
 
     except Exception as e:
@@ -206,7 +352,7 @@ Please use the available tools to research this topic thoroughly and provide a c
 # =========================
 
 # List of preferred domains for Tavily results
-TOP_DOMAINS = {
+TOP_DOMAINS = frozenset({
     # General reference / institutions / publishers
     "wikipedia.org", "nature.com", "science.org", "sciencemag.org", "cell.com",
     "mit.edu", "stanford.edu", "harvard.edu", "nasa.gov", "noaa.gov", "europa.eu",
@@ -222,7 +368,42 @@ TOP_DOMAINS = {
 
     # Well known programming sites
     "codecademy.com", "datacamp.com"
-}
+})
+
+_URL_RE = re.compile(r'https?://[^\s\]\)>\}]+', flags=re.IGNORECASE)
+
+
+_TRIE_END = None  # Marks a node where a preferred domain ends
+
+
+@functools.lru_cache(maxsize=8)
+def _suffix_trie(domains: frozenset) -> dict:
+    """
+    Build (once per domain set) a trie over the reversed domain labels,
+    e.g. "arxiv.org" -> {"org": {"arxiv": {_TRIE_END: True}}}.
+    """
+    trie = {}
+    for d in domains:
+        node = trie
+        for label in reversed(d.lower().split(".")):
+            node = node.setdefault(label, {})
+        node[_TRIE_END] = True
+    return trie
+
+
+def _is_preferred(trie: dict, domain: str) -> bool:
+    """
+    True if `domain` is a preferred domain or one of its subdomains
+    ("export.arxiv.org" matches "arxiv.org"; "summit.edu" does not match "mit.edu").
+    """
+    node = trie
+    for label in reversed(domain.split(".")):
+        node = node.get(label)
+        if node is None:
+            return False
+        if _TRIE_END in node:
+            return True
+    return False
 
 
 def evaluate_tavily_results(TOP_DOMAINS, raw: str, min_ratio=0.4):
@@ -233,7 +414,7 @@ def evaluate_tavily_results(TOP_DOMAINS, raw: str, min_ratio=0.4):
     each URL is checked against the predefined list of preferred domains.
 
     Args:
-        TOP_DOMAINS (set[str]): Set of preferred domains (e.g., 'arxiv.org', 'nature.com').
+        TOP_DOMAINS (frozenset[str]): Set of preferred domains (e.g., 'arxiv.org', 'nature.com').
         raw (str): Plain text or Markdown containing URLs.
         min_ratio (float): Minimum preferred ratio required to pass (e.g., 0.4 = 40%).
 
@@ -242,32 +423,40 @@ def evaluate_tavily_results(TOP_DOMAINS, raw: str, min_ratio=0.4):
             flag -> True if PASS, False if FAIL
             markdown_report -> Markdown-formatted summary of the evaluation
     """
+    # frozenset() of a frozenset is a no-op, and makes the call memoizable
+    return _evaluate_tavily_results(frozenset(TOP_DOMAINS), raw, min_ratio)
 
-    # Extract URLs from the text
-    url_pattern = re.compile(r'https?://[^\s\]\)>\}]+', flags=re.IGNORECASE)
-    urls = url_pattern.findall(raw)
 
-    if not urls:
-        return False, """### Evaluation — Tavily Preferred Domains
-No URLs detected in the provided text. 
-Please include links in your research results.
-"""
+@functools.lru_cache(maxsize=128)
+def _evaluate_tavily_results(domains: frozenset, raw: str, min_ratio: float):
+    trie = _suffix_trie(domains)
 
-    # Count preferred vs total
-    total = len(urls)
+    # Single pass: classify each URL as it is matched
+    total = 0
     preferred_count = 0
-    details = []
+    details = io.StringIO()
 
-    for url in urls:
+    for match in _URL_RE.finditer(raw):
+        url = match.group()
+        total += 1
         try:
-            domain = url.split("/")[2]
-        except IndexError:
-            domain = url
+            hostname = urlsplit(url).hostname
+        except ValueError:  # e.g. malformed IPv6 netloc
+            hostname = None
+        domain = (hostname or url).lower().rstrip(".")
         
-        preferred = any(td in domain for td in TOP_DOMAINS)
+        preferred = _is_preferred(trie, domain)
         if preferred:
             preferred_count += 1
-        details.append(f"- {url} → {'✅ PREFERRED' if preferred else '❌ NOT PREFERRED'}")
+        details.write("- ")
+        details.write(url)
+        details.write(" → ✅ PREFERRED\n" if preferred else " → ❌ NOT PREFERRED\n")
+
+    if not total:
+        return False, """### Evaluation — Tavily Preferred Domains
+No URLs detected in the provided text. 
+Please include links in your research results.
+"""
 
     ratio = preferred_count / total if total > 0 else 0.0
     flag = ratio >= min_ratio
@@ -282,8 +471,7 @@ Please include links in your research results.
 - Status: {"✅ PASS" if flag else "❌ FAIL"}
 
 **Details:**
-{chr(10).join(details)}
-"""
+{details.getvalue()}"""
     return flag, report
 
 
@@ -293,14 +481,26 @@ Please include links in your research results.
 
 if __name__ == "__main__":
     
+    topic = "alien life"
+    min_ratio = 0.4
+    
+    # Both examples are independent agentic loops: run them concurrently
+    # (the Anthropic client is thread-safe and shares its connection pool)
+    example_tasks = [
+        "Find 2 recent papers about recent developments in black hole science",
+        f"Find 2–3 key papers and reliable overviews about {topic}.",
+    ]
+    with ThreadPoolExecutor(max_workers=len(example_tasks)) as pool:
+        research_result, research_output = pool.map(
+            lambda task: find_references(task, model="claude-opus-4-1"),
+            example_tasks,
+        )
+    
     # Example 1: Basic research task
     print("=" * 60)
     print("EXAMPLE 1: Research on Black Hole Science")
     print("=" * 60)
     
-    research_task = "Find 2 recent papers about recent developments in black hole science"
-    research_result = find_references(research_task, model="claude-opus-4-1")
-    
     print("\nResearch Results:")
     print(research_result)
     
@@ -313,18 +513,12 @@ if __name__ == "__main__":
     print("EXAMPLE 2: Custom Research Task")
     print("=" * 60)
     
-    topic = "alien life"
-    min_ratio = 0.4
-    
     print(f"\nTopic: {topic}")
     print(f"Min Ratio: {min_ratio:.0%}")
     print(f"\nPreferred Domains: {sorted(list(TOP_DOMAINS))[:5]}... (and {len(TOP_DOMAINS) - 5} more)")
     
-    research_task = f"Find 2–3 key papers and reliable overviews about {topic}."
-    research_output = find_references(research_task, model="claude-opus-4-1")
-    
     print("\nResearch Results:")
     print(research_output)
     
     flag, eval_md = evaluate_tavily_results(TOP_DOMAINS, research_output, min_ratio=min_ratio)
-    print("\n" + eval_md)
\ No newline at end of file
+    print("\n" + eval_md)
@@ -0,0 +1,298 @@
+"""
+llm_cache.py
+Keyed response cache for Anthropic ``client.messages.create`` calls.
+
+Deterministic agent loops (same model, system prompt, messages, tools and
+max_tokens) are served from the cache instead of re-running against the API,
+so re-executing a notebook cell costs no tokens and returns almost instantly.
+
+Configuration (environment variables):
+    LLM_CACHE      "disk" (default), "memory" or "off"
+    LLM_CACHE_DIR  Directory used by the disk backend (default: .llm_cache)
+"""
+
+import atexit
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, Protocol
+
+import orjson
+
+
+# =========================
+# Backends
+# =========================
+
+class CacheBackend(Protocol):
+    """Minimal key/value interface a cache backend must provide."""
+
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    def set(self, key: str, value: bytes, expire: float | None = None) -> None:
+        """Store ``value``; with ``expire``, it is dropped after that many seconds."""
+        ...
+
+
+class MemoryCache:
+    """In-process dict backend. Entries are lost when the process exits."""
+
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float | None]] = {}
+
+    def get(self, key: str) -> bytes | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, deadline = entry
+        if deadline is not None and time.monotonic() >= deadline:
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: bytes, expire: float | None = None) -> None:
+        self._data[key] = (value, None if expire is None else time.monotonic() + expire)
+
+
+class DiskCache:
+    """Persistent backend on top of ``diskcache.Cache``."""
+
+    def __init__(self, directory: str):
+        import diskcache  # Optional dependency, only needed for this backend
+
+        self._cache = diskcache.Cache(directory)
+
+    def get(self, key: str) -> bytes | None:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes, expire: float | None = None) -> None:
+        self._cache.set(key, value, expire=expire)
+
+
+def open_backend(directory: str) -> CacheBackend | None:
+    """
+    Build a backend for ``directory`` according to ``LLM_CACHE``.
+
+    Args:
+        directory (str): Directory used when the disk backend is selected
+
+    Returns:
+        CacheBackend or None: None when caching is disabled.
+    """
+    kind = os.getenv("LLM_CACHE", "disk").lower()
+    if kind == "off":
+        return None
+    if kind == "memory":
+        return MemoryCache()
+    try:
+        return DiskCache(directory)
+    except ImportError:
+        print(f"⚠️ diskcache not installed. Using in-memory cache instead of {directory}.")
+        return MemoryCache()
+
+
+@functools.lru_cache(maxsize=1)
+def get_backend() -> CacheBackend | None:
+    """Resolve the LLM response backend once, on first use."""
+    return open_backend(os.getenv("LLM_CACHE_DIR", ".llm_cache"))
+
+
+# =========================
+# Hit/miss counters
+# =========================
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str) -> None:
+    with _stats_lock:
+        _stats[name] += 1
+
+
+@atexit.register
+def _report_stats() -> None:
+    if _stats["hits"] or _stats["misses"]:
+        print(f"\n🗄️ LLM cache: {_stats['hits']} hits / {_stats['misses']} misses")
+
+
+# =========================
+# Keying & serialization
+# =========================
+
+def _serialize_content(obj: Any) -> Any:
+    """JSON fallback for SDK content blocks (pydantic models) in ``messages``."""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump(mode="json")
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Cannot serialize {type(obj).__name__} for cache key")
+
+
+_tool_digests: dict[int, tuple[tuple, str]] = {}
+
+
+def _tools_digest(tools) -> str:
+    """
+    Hash a ``tools`` list for the cache key.
+
+    Agent loops send the same frozen tool tuple on every turn, so its digest
+    is remembered by identity (the tuple is kept alive alongside it, so the
+    id cannot be reused) instead of re-serializing the schemas each turn.
+    """
+    if isinstance(tools, tuple):
+        known = _tool_digests.get(id(tools))
+        if known is not None and known[0] is tools:
+            return known[1]
+    payload = orjson.dumps(tools, option=orjson.OPT_SORT_KEYS, default=_serialize_content)
+    digest = hashlib.sha256(payload).hexdigest()
+    if isinstance(tools, tuple):
+        _tool_digests[id(tools)] = (tools, digest)
+    return digest
+
+
+def cache_key(**kwargs) -> str | None:
+    """
+    Compute the cache key for a ``messages.create`` request.
+
+    Args:
+        **kwargs: The keyword arguments that would be sent to the API
+
+    Returns:
+        str or None: SHA-256 hex digest, or None if the request must not be
+        cached (caching disabled, or sampling with ``temperature > 0``).
+    """
+    if get_backend() is None or (kwargs.get("temperature") or 0) > 0:
+        return None
+    if "tools" in kwargs:
+        kwargs["tools"] = _tools_digest(kwargs["tools"])
+    payload = orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS, default=_serialize_content)
+    return hashlib.sha256(payload).hexdigest()
+
+
+def load(key: str):
+    """Return the cached ``anthropic.types.Message`` for ``key``, or None."""
+    backend = get_backend()
+    if backend is None:
+        return None
+    raw = backend.get(key)
+    if raw is None:
+        _count("misses")
+        return None
+
+    from anthropic.types import Message
+
+    _count("hits")
+    return Message.model_validate(orjson.loads(raw))
+
+
+def save(key: str, response) -> None:
+    """Store a ``Message`` under ``key``."""
+    backend = get_backend()
+    if backend is not None:
+        backend.set(key, orjson.dumps(response.model_dump(mode="json")))
+
+
+# =========================
+# Cached API wrapper
+# =========================
+
+def cached_messages_create(client, **kwargs):
+    """
+    Drop-in replacement for ``client.messages.create(**kwargs)``.
+
+    Args:
+        client: An ``anthropic.Anthropic`` client
+        **kwargs: Arguments forwarded to ``client.messages.create``
+
+    Returns:
+        anthropic.types.Message: Cached or freshly created response
+    """
+    key = cache_key(**kwargs)
+    if key is None:
+        return client.messages.create(**kwargs)
+
+    cached = load(key)
+    if cached is not None:
+        return cached
+
+    response = client.messages.create(**kwargs)
+    save(key, response)
+    return response
+
+
+def cached_messages_stream(client, on_block=None, **kwargs):
+    """
+    Like ``cached_messages_create``, but streams the response on a cache miss
+    and reports each content block as soon as it is complete, so callers can
+    start working on early tool_use blocks while Claude is still decoding.
+
+    Args:
+        client: An ``anthropic.Anthropic`` client
+        on_block (callable): Called with every finished content block, in order
+        **kwargs: Arguments forwarded to ``client.messages.stream``
+
+    Returns:
+        anthropic.types.Message: Cached or freshly streamed response
+    """
+    key = cache_key(**kwargs)
+    cached = load(key) if key is not None else None
+    if cached is not None:
+        if on_block is not None:
+            for block in cached.content:
+                on_block(block)
+        return cached
+
+    with client.messages.stream(**kwargs) as stream:
+        for event in stream:
+            if event.type == "content_block_stop" and on_block is not None:
+                on_block(event.content_block)
+        response = stream.get_final_message()
+
+    if key is not None:
+        save(key, response)
+    return response
+
+
+# =========================
+# Async variants (AsyncAnthropic)
+# =========================
+
+async def acached_messages_create(client, **kwargs):
+    """``cached_messages_create`` for an ``anthropic.AsyncAnthropic`` client."""
+    key = cache_key(**kwargs)
+    if key is None:
+        return await client.messages.create(**kwargs)
+
+    cached = load(key)
+    if cached is not None:
+        return cached
+
+    response = await client.messages.create(**kwargs)
+    save(key, response)
+    return response
+
+
+async def acached_messages_stream(client, on_block=None, **kwargs):
+    """``cached_messages_stream`` for an ``anthropic.AsyncAnthropic`` client."""
+    key = cache_key(**kwargs)
+    cached = load(key) if key is not None else None
+    if cached is not None:
+        if on_block is not None:
+            for block in cached.content:
+                on_block(block)
+        return cached
+
+    async with client.messages.stream(**kwargs) as stream:
+        async for event in stream:
+            if event.type == "content_block_stop" and on_block is not None:
+                on_block(event.content_block)
+        response = await stream.get_final_message()
+
+    if key is not None:
+        save(key, response)
+    return response
@@ -0,0 +1,156 @@
+"""
+Batch campaign packaging via the Anthropic Message Batches API.
+
+`run_sunglasses_campaign_pipeline` handles one campaign at a time. When many
+campaigns already have their research and image, the two tail calls of each
+(copywriter quote + executive summary rewrite) are submitted together as one
+Message Batch: half the price of individual calls, processed asynchronously
+by Anthropic. Results are matched back to their campaign by `custom_id` and
+each campaign's report is assembled as usual.
+
+Small jobs (fewer than `MIN_BATCH_SIZE` campaigns) are not worth the batch
+round-trip and run as concurrent regular calls instead.
+"""
+
+# =========================
+# Imports
+# =========================
+
+# --- Standard library ---
+import asyncio
+import os
+import sys
+
+# --- Local / project ---
+# clients lives in the repo root, one level up (appended, so local modules win)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import clients
+import campaign_pipeline as pipeline
+import utils_multi_agent as utils
+
+
+client = clients.ANTHROPIC_ASYNC
+MIN_BATCH_SIZE = 4
+
+
+# =========================
+# Message Batches
+# =========================
+
+async def _wait_for_batch(batch_id: str, poll_interval: float = 5.0, max_interval: float = 60.0):
+    """Poll a batch with exponential backoff until its processing has ended."""
+    while True:
+        batch = await client.messages.batches.retrieve(batch_id)
+        if batch.processing_status == "ended":
+            return batch
+        counts = batch.request_counts
+        print(f"   ⏳ Batch {batch_id}: {counts.processing} processing, {counts.succeeded} succeeded")
+        await asyncio.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, max_interval)
+
+
+async def submit_batch(requests: dict[str, dict]) -> dict[str, str | None]:
+    """
+    Run messages.create requests through one Message Batch.
+
+    Args:
+        requests: {custom_id: messages.create parameters}
+
+    Returns:
+        dict: {custom_id: response text, or None if that request failed}
+    """
+    batch = await client.messages.batches.create(
+        requests=[{"custom_id": custom_id, "params": params} for custom_id, params in requests.items()]
+    )
+    print(f"📨 Submitted batch {batch.id} with {len(requests)} requests")
+
+    await _wait_for_batch(batch.id)
+
+    texts = dict.fromkeys(requests)
+    async for entry in await client.messages.batches.results(batch.id):
+        if entry.result.type == "succeeded":
+            texts[entry.custom_id] = clients.response_text(entry.result.message.content)
+        else:
+            print(f"⚠️ Batch request {entry.custom_id} {entry.result.type}")
+    return texts
+
+
+# =========================
+# Batch entry point
+# =========================
+
+async def _run_individually(campaigns: list[dict], model: str | None) -> list[tuple]:
+    """Fallback for small jobs: the regular agents, all campaigns concurrently."""
+    overrides = {"model": model} if model else {}
+
+    async def one(campaign):
+        return await asyncio.gather(
+            pipeline.copywriter_agent(campaign["image_path"], campaign["trend_summary"], **overrides),
+            pipeline._beautify_summary(campaign["trend_summary"], **overrides)
+        )
+
+    return await asyncio.gather(*(one(campaign) for campaign in campaigns))
+
+
+async def run_batch(campaigns: list[dict], model: str | None = None) -> list[dict]:
+    """
+    Write quotes and executive reports for many campaigns at once.
+
+    Args:
+        campaigns: One dict per campaign with "trend_summary", "image_path"
+            and optionally "output_path"
+        model: Claude model for both calls (default: the agents' tiers)
+
+    Returns:
+        list: Per campaign, {"quote": {...}, "markdown_path": str}, in input order
+    """
+    utils.log_agent_title_html(f"Batch Packaging ({len(campaigns)} campaigns)", "📦")
+
+    if len(campaigns) < MIN_BATCH_SIZE:
+        outputs = await _run_individually(campaigns, model)
+    else:
+        copy_model = model or clients.MODEL_TIERS["vision"]
+        summary_model = model or clients.MODEL_TIERS["fast"]
+
+        requests = {}
+        for i, campaign in enumerate(campaigns):
+            media_type, image_data = await asyncio.to_thread(pipeline._encode_image, campaign["image_path"])
+            requests[f"copy-{i}"] = pipeline._copywriter_request(
+                media_type, image_data, campaign["trend_summary"], copy_model
+            )
+            requests[f"summary-{i}"] = pipeline._beautify_request(campaign["trend_summary"], summary_model)
+
+        texts = await submit_batch(requests)
+        outputs = [
+            (
+                pipeline._parse_copy(texts[f"copy-{i}"] or ""),
+                texts[f"summary-{i}"] or campaign["trend_summary"]
+            )
+            for i, campaign in enumerate(campaigns)
+        ]
+
+    results = []
+    for i, (campaign, (quote_result, beautified_summary)) in enumerate(zip(campaigns, outputs)):
+        md_path = pipeline._assemble_markdown(
+            beautified_summary,
+            image_url=campaign["image_path"],
+            quote=quote_result.get("quote", "Experience the moment."),
+            justification=quote_result.get("justification", "Campaign analysis."),
+            output_path=campaign.get("output_path", f"campaign_summary_batch_{i}.md")
+        )
+        results.append({"quote": quote_result, "markdown_path": md_path})
+
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    # Usage: python batch.py "<trend summary>" image1.png image2.png ...
+    trend_summary, *image_paths = sys.argv[1:]
+    campaigns = [
+        {"trend_summary": trend_summary, "image_path": path}
+        for path in image_paths if os.path.exists(path)
+    ]
+    for result in asyncio.run(run_batch(campaigns)):
+        print(f"📦 {result['markdown_path']}: {result['quote'].get('quote', 'N/A')}")
@@ -16,20 +16,31 @@ This demonstrates multi-agent coordination, tool-calling, and multimodal AI.
 # =========================
 
 # --- Standard library ---
+import asyncio
 import base64
-import json
+import functools
+import hashlib
+import io
+import mimetypes
 import os
-import re
+import shutil
+import string
+import sys
+import threading
+import time
 from datetime import datetime
-from io import BytesIO
 
 # --- Third-party ---
-import requests
-from PIL import Image
 from dotenv import load_dotenv
-import anthropic
+import orjson
 
 # --- Local / project (you'll need to create these) ---
+# clients, llm_cache and semantic_cache live in the repo root, one level up
+# (appended, so this directory's own tools.py / utils.py still win)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import clients
+import llm_cache
+from semantic_cache import semantic_cache, skip_store
 import tools_multi_agent as tools
 import utils_multi_agent as utils
 
@@ -38,22 +49,108 @@ import utils_multi_agent as utils
 # Environment & Client
 # =========================
 load_dotenv()
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-openai_client = None  # For DALL-E image generation only
+client = clients.ANTHROPIC_ASYNC  # Shared, pooled HTTP/2 AsyncAnthropic client
 
-# Initialize OpenAI client for DALL-E (image generation)
-try:
-    import openai
-    openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except ImportError:
-    print("⚠️ OpenAI not installed. Image generation will be unavailable.")
+# OpenAI client for DALL-E (image generation only), created on first use so
+# agents that never generate images don't pay for importing openai
+_openai_client = None
+_openai_lock = threading.Lock()
+
+
+def _get_openai_client():
+    """Return the shared OpenAI client, or None if openai is not installed."""
+    global _openai_client
+    with _openai_lock:
+        if _openai_client is None:
+            try:
+                import openai
+            except ImportError:
+                print("⚠️ OpenAI not installed. Image generation will be unavailable.")
+                _openai_client = False
+            else:
+                _openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        return _openai_client or None
+
+
+@functools.lru_cache(maxsize=1)
+def _http_session():
+    """Keep-alive session reused for every DALL-E image download."""
+    import requests
+    
+    return requests.Session()
 
 
 # =========================
 # AGENT 1: Market Research Agent
 # =========================
 
-def market_research_agent(model: str = "claude-sonnet-4-20250514", return_messages: bool = False):
+async def _stream_turn(**kwargs):
+    """
+    Stream one Claude turn, starting each tool_use block in a worker thread as
+    soon as it is complete so tools run while Claude is still decoding.
+    
+    Args:
+        **kwargs: Arguments for client.messages.stream
+        
+    Returns:
+        tuple: (response, [(tool_use_block, task), ...]) in block order
+    """
+    pending = []
+    
+    def on_block(block):
+        if block.type == "tool_use":
+            utils.log_tool_call_html(block.name, orjson.dumps(block.input).decode())
+            task = asyncio.create_task(
+                asyncio.to_thread(tools.handle_tool_call_claude, block.name, block.input)
+            )
+            pending.append((block, task))
+    
+    response = await llm_cache.acached_messages_stream(client, on_block=on_block, **kwargs)
+    return response, pending
+
+
+async def _collect_tool_results(pending, seen_results: set) -> tuple:
+    """
+    Wait for dispatched tool calls and build tool_result blocks in order.
+    
+    Args:
+        pending: [(tool_use_block, task), ...] from _stream_turn
+        seen_results: Fingerprints of tool calls/results seen so far (updated in place)
+        
+    Returns:
+        tuple: (tool_results, new_information) where new_information is False
+        when every call of this turn repeated an earlier call and result
+    """
+    tool_results = []
+    new_information = False
+    for block, task in pending:
+        result = await task
+        utils.log_tool_result_html(result)
+        content = orjson.dumps(result).decode() if not isinstance(result, str) else result
+        
+        signature = hashlib.sha256(
+            (block.name + orjson.dumps(block.input, option=orjson.OPT_SORT_KEYS).decode()
+             + content[:1024]).encode("utf-8")
+        ).hexdigest()
+        if signature not in seen_results:
+            seen_results.add(signature)
+            new_information = True
+        
+        tool_results.append({
+            "type": "tool_result",
+            "tool_use_id": block.id,
+            "content": content
+        })
+    return tool_results, new_information
+
+
+# Research for the same season is reused for a week
+@semantic_cache(
+    namespace="market_research",
+    ttl=7 * 24 * 3600,
+    cacheable=lambda result: isinstance(result, str) and bool(result.strip()) and not result.startswith("[⚠️")
+)
+async def market_research_agent(model: str = clients.MODEL_TIERS["fast"], return_messages: bool = False):
     """
     Fashion market research agent that:
     1. Explores current fashion trends using web search
@@ -84,7 +181,7 @@ Once your analysis is complete, summarize:
     
     prompt = f"""Please conduct market research for our summer sunglasses campaign.
 
-Today's date is {datetime.now().strftime("%Y-%m-%d")}.
+Today's date is {clients.today()}.
 
 Use the available tools to:
 1. Search for current sunglasses fashion trends
@@ -101,56 +198,58 @@ Provide a comprehensive analysis with your findings and recommendations."""
     # Agent loop
     max_iterations = 10
     iteration = 0
+    seen_results = set()
     
     while iteration < max_iterations:
         iteration += 1
         
-        response = client.messages.create(
+        started = time.perf_counter()
+        response, pending = await _stream_turn(
             model=model,
             max_tokens=4096,
             system=system_prompt,
             messages=messages,
             tools=tools_list
         )
+        print(f"   ↻ iteration {iteration}: {time.perf_counter() - started:.1f}s, "
+              f"{response.usage.input_tokens} input / {response.usage.output_tokens} output tokens")
         
         # Check if Claude wants to use tools
         if response.stop_reason == "tool_use":
+            # Tools were dispatched while streaming; collect their results
+            tool_results, new_information = await _collect_tool_results(pending, seen_results)
+            
             # Add Claude's response to messages
             messages.append({
                 "role": "assistant",
                 "content": response.content
             })
             
-            # Execute tools
-            tool_results = []
-            for block in response.content:
-                if block.type == "tool_use":
-                    tool_name = block.name
-                    tool_input = block.input
-                    
-                    utils.log_tool_call_html(tool_name, json.dumps(tool_input))
-                    
-                    # Execute the tool
-                    result = tools.handle_tool_call_claude(tool_name, tool_input)
-                    utils.log_tool_result_html(result)
-                    
-                    tool_results.append({
-                        "type": "tool_result",
-                        "tool_use_id": block.id,
-                        "content": json.dumps(result) if not isinstance(result, str) else result
-                    })
-            
             # Add tool results back
             messages.append({
                 "role": "user",
                 "content": tool_results
             })
-        else:
+            
+            # Only repeated calls with known results: more tool rounds
+            # would not add anything, so one last turn with tools disabled
+            # writes the answer from what Claude already has
+            if new_information:
+                continue
+            print(f"   ✓ converged after {iteration} tool iteration(s): repeated tool calls only")
+            skip_store()  # Research cut short: don't reuse it for a week
+            response, _ = await _stream_turn(
+                model=model,
+                max_tokens=4096,
+                system=system_prompt,
+                messages=messages,
+                tools=tools_list,
+                tool_choice={"type": "none"}
+            )
+        
+        if response.stop_reason != "tool_use":
             # Final answer
-            final_content = ""
-            for block in response.content:
-                if hasattr(block, "text"):
-                    final_content += block.text
+            final_content = clients.response_text(response.content)
             
             utils.log_final_summary_html(final_content)
             return (final_content, messages) if return_messages else final_content
@@ -158,13 +257,196 @@ Provide a comprehensive analysis with your findings and recommendations."""
     return "[⚠️ Max iterations reached]"
 
 
+# =========================
+# Fixed-schema JSON reader
+# =========================
+
+_JSON_WS = " \t\r\n"
+
+
+def _read_string_field(text: str, field: str, start: int = 0):
+    """
+    Read the JSON string value of `"field": "..."` found at or after `start`.
+    
+    Args:
+        text: Model output containing a JSON object
+        field: Key to look for
+        start: Offset to start searching from
+        
+    Returns:
+        tuple: (value, end_offset), or (None, start) if the shape does not match
+    """
+    i = text.find(f'"{field}"', start)
+    if i < 0:
+        return None, start
+    i += len(field) + 2
+    n = len(text)
+    
+    while i < n and text[i] in _JSON_WS:
+        i += 1
+    if i >= n or text[i] != ":":
+        return None, start
+    i += 1
+    while i < n and text[i] in _JSON_WS:
+        i += 1
+    if i >= n or text[i] != '"':
+        return None, start
+    
+    # Find the closing quote, skipping quotes escaped by an odd number of backslashes
+    j = i + 1
+    while True:
+        j = text.find('"', j)
+        if j < 0:
+            return None, start
+        k = j - 1
+        while text[k] == "\\":
+            k -= 1
+        if (j - 1 - k) % 2 == 0:
+            break
+        j += 1
+    
+    literal = text[i:j + 1]
+    if "\\" not in literal:
+        return literal[1:-1], j + 1
+    try:
+        return orjson.loads(literal), j + 1
+    except orjson.JSONDecodeError:
+        return None, start
+
+
+def _read_string_fields(text: str, fields: tuple):
+    """
+    Schema-specific parser for small `{"a": "...", "b": "..."}` replies.
+    
+    Reads the string values of `fields` (in that order) straight out of the
+    text, without building a dict or running a regex over the whole reply.
+    
+    Returns:
+        tuple or None: The field values, or None on any shape mismatch
+    """
+    pos = text.find("{")
+    if pos < 0:
+        return None
+    values = []
+    for field in fields:
+        value, pos = _read_string_field(text, field, pos)
+        if value is None:
+            return None
+        values.append(value)
+    return tuple(values)
+
+
+def _json_object_spans(text: str):
+    """
+    Yield (start, end) of each balanced top-level `{...}` in `text`.
+    
+    Single pass with a small state machine (depth, inside-string, escape),
+    so braces inside JSON strings are ignored and malformed replies cost
+    O(n) instead of regex backtracking over every `{`.
+    """
+    depth = 0
+    start = 0
+    in_string = False
+    escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = depth > 0
+        elif ch == "{":
+            if depth == 0:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                yield start, i + 1
+
+
+def _load_json_object(text: str):
+    """
+    Parse the first JSON object embedded in a model reply.
+    
+    Returns:
+        dict or None: The object, or None if no `{...}` in the text parses
+    """
+    for start, end in _json_object_spans(text):
+        try:
+            data = orjson.loads(text[start:end])
+        except orjson.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
 # =========================
 # AGENT 2: Graphic Designer Agent
 # =========================
 
-def graphic_designer_agent(
+# =========================
+# Content-addressed asset cache
+# =========================
+
+# Generated images and executive summaries are stored under their input
+# hash, so identical inputs skip DALL-E calls and the summary rewrite entirely
+_ASSET_CACHE_DIR = ".cache"
+
+
+def _asset_path(kind: str, key: str, suffix: str) -> str | None:
+    """Path of a cached asset, or None when caching is disabled (LLM_CACHE=off)."""
+    if os.getenv("LLM_CACHE", "disk").lower() == "off":
+        return None
+    return os.path.join(_ASSET_CACHE_DIR, kind, f"{key}{suffix}")
+
+
+def _store_asset(path: str | None, source: str) -> None:
+    """Copy a freshly generated file into the cache (write-through)."""
+    if path is not None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(source, path)
+
+
+def _generate_image(openai_client, image_prompt: str, size: str) -> tuple:
+    """
+    Generate the campaign image with DALL-E and save it to disk.
+    
+    Blocking (OpenAI SDK + requests), so the agent runs it in a worker thread.
+    
+    Returns:
+        tuple: (image_url, image_filename)
+    """
+    dalle_response = openai_client.images.generate(
+        model="dall-e-3",
+        prompt=image_prompt,
+        size=size,
+        quality="standard",
+        n=1
+    )
+    
+    image_url = dalle_response.data[0].url
+    
+    # Download and save image (DALL-E already returns a PNG, so the
+    # bytes are written as-is instead of being decoded and re-encoded)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    image_filename = f"campaign_image_{timestamp}.png"
+    with _http_session().get(image_url, timeout=30, stream=True) as img_response:
+        img_response.raise_for_status()
+        with open(image_filename, "wb") as f:
+            for chunk in img_response.iter_content(chunk_size=64 * 1024):
+                f.write(chunk)
+    
+    return image_url, image_filename
+
+
+async def graphic_designer_agent(
     trend_insights: str,
-    model: str = "claude-sonnet-4-20250514",
+    model: str = clients.MODEL_TIERS["default"],
     caption_style: str = "short punchy",
     size: str = "1024x1024"
 ) -> dict:
@@ -204,7 +486,8 @@ Format your response as JSON:
 Make the image prompt vivid, specific, and aligned with luxury sunglasses marketing."""
     
     # Get prompt and caption from Claude
-    response = client.messages.create(
+    response = await llm_cache.acached_messages_stream(
+        client,
         model=model,
         max_tokens=2048,
         system=system_prompt,
@@ -212,49 +495,46 @@ Make the image prompt vivid, specific, and aligned with luxury sunglasses market
     )
     
     # Extract response
-    response_text = ""
-    for block in response.content:
-        if hasattr(block, "text"):
-            response_text += block.text
+    response_text = clients.response_text(response.content)
     
     utils.log_tool_result_html(response_text)
     
-    # Parse JSON response
-    try:
+    # Parse JSON response (fast path: read the two known fields directly)
+    fields = _read_string_fields(response_text, ("image_prompt", "caption"))
+    if fields is not None:
+        image_prompt, caption = fields
+    else:
         # Extract JSON from response
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            design_data = json.loads(json_match.group())
+        design_data = _load_json_object(response_text)
+        if design_data is not None:
+            image_prompt = design_data.get("image_prompt", "")
+            caption = design_data.get("caption", "")
         else:
-            design_data = json.loads(response_text)
-        
-        image_prompt = design_data.get("image_prompt", "")
-        caption = design_data.get("caption", "")
-    except json.JSONDecodeError:
-        # Fallback if JSON parsing fails
-        image_prompt = response_text[:500]
-        caption = "Experience the trend."
+            # Fallback if JSON parsing fails
+            image_prompt = response_text[:500]
+            caption = "Experience the trend."
+    
+    # Same prompt and size: reuse the image generated earlier
+    cached_image = _asset_path("images", hashlib.sha256(f"{size}|{image_prompt}".encode("utf-8")).hexdigest(), ".png")
+    if cached_image is not None and os.path.exists(cached_image):
+        image_filename = f"campaign_image_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+        shutil.copyfile(cached_image, image_filename)
+        utils.log_tool_result_html(f"🗄️ Reused cached image as {image_filename}")
+        return {
+            "image_url": cached_image,
+            "image_path": image_filename,
+            "prompt": image_prompt,
+            "caption": caption
+        }
     
     # Generate image using DALL-E
+    openai_client = _get_openai_client()
     if openai_client:
         try:
-            dalle_response = openai_client.images.generate(
-                model="dall-e-3",
-                prompt=image_prompt,
-                size=size,
-                quality="standard",
-                n=1
+            image_url, image_filename = await asyncio.to_thread(
+                _generate_image, openai_client, image_prompt, size
             )
-            
-            image_url = dalle_response.data[0].url
-            
-            # Download and save image
-            img_response = requests.get(image_url, timeout=30)
-            img = Image.open(BytesIO(img_response.content))
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            image_filename = f"campaign_image_{timestamp}.png"
-            img.save(image_filename)
+            _store_asset(cached_image, image_filename)
             
             utils.log_tool_result_html(f"✅ Image generated and saved as {image_filename}")
             
@@ -280,57 +560,105 @@ Make the image prompt vivid, specific, and aligned with luxury sunglasses market
 
 
 # =========================
-# AGENT 3: Copywriter Agent
+# Prompt caching helpers
 # =========================
 
-def copywriter_agent(
-    image_path: str,
-    trend_summary: str,
-    model: str = "claude-sonnet-4-20250514"
-) -> dict:
+# Anthropic only caches prefixes of at least ~1024 tokens (~4 chars/token);
+# the short system prompts get no breakpoint of their own, they are cached
+# as part of the prefix ending at the long research block
+_PROMPT_CACHE_MIN_CHARS = 4096
+
+
+def _text_block(text: str) -> dict:
+    """User text block, marked as a cache breakpoint when it is long enough to be cached."""
+    block = {"type": "text", "text": text}
+    if len(text) >= _PROMPT_CACHE_MIN_CHARS:
+        block["cache_control"] = {"type": "ephemeral"}
+    return block
+
+
+async def _stream_text(**kwargs) -> tuple:
     """
-    Generates a campaign quote by analyzing the image and trends using Claude's vision capabilities.
+    Stream a Claude response, accumulating text deltas as they arrive instead
+    of waiting for the whole completion.
     
     Args:
-        image_path: Path to campaign image
-        trend_summary: Market research findings
-        model: Claude model to use
+        **kwargs: Arguments for client.messages.stream
         
     Returns:
-        dict: Contains quote and justification
+        tuple: (text, final_message) - the message carries stop_reason and usage
     """
+    buffer = io.StringIO()
+    async with client.messages.stream(**kwargs) as stream:
+        async for text in stream.text_stream:
+            buffer.write(text)
+        response = await stream.get_final_message()
+    return buffer.getvalue(), response
+
+
+def _log_cache_usage(agent: str, response) -> None:
+    """Print how many input tokens were written to / read from the prompt cache."""
+    usage = response.usage
+    read = getattr(usage, "cache_read_input_tokens", 0) or 0
+    written = getattr(usage, "cache_creation_input_tokens", 0) or 0
+    if read or written:
+        print(f"   🧊 {agent} prompt cache: {read} read / {written} written / {usage.input_tokens} uncached input tokens")
+
+
+# =========================
+# AGENT 3: Copywriter Agent
+# =========================
+
+# Image formats accepted by Claude vision
+_SUPPORTED_IMAGE_TYPES = frozenset({"image/png", "image/jpeg", "image/gif", "image/webp"})
+
+
+def _image_media_type(image_path: str) -> str | None:
+    """Media type of an image path, or None if Claude can't read that format."""
+    media_type = mimetypes.guess_type(image_path)[0]
+    return media_type if media_type in _SUPPORTED_IMAGE_TYPES else None
+
+
+@functools.lru_cache(maxsize=32)
+def _encode_cached(image_path: str, mtime: float) -> tuple:
+    """Encode once per (path, mtime); a rewritten file gets a new entry."""
+    media_type = _image_media_type(image_path)
+    if media_type is None:
+        raise ValueError(f"Unsupported image type {mimetypes.guess_type(image_path)[0]}: {image_path}")
+    with open(image_path, "rb") as img_file:
+        return media_type, base64.standard_b64encode(img_file.read()).decode("utf-8")
+
+
+def _encode_image(image_path: str) -> tuple:
+    """
+    Read and base64-encode an image (blocking file I/O, run in a thread).
     
-    utils.log_agent_title_html("Copywriter Agent", "✍️")
-    
-    # Read and encode image
-    try:
-        with open(image_path, "rb") as img_file:
-            image_data = base64.standard_b64encode(img_file.read()).decode("utf-8")
-        
-        # Determine image type
-        if image_path.lower().endswith(".png"):
-            media_type = "image/png"
-        elif image_path.lower().endswith((".jpg", ".jpeg")):
-            media_type = "image/jpeg"
-        else:
-            media_type = "image/png"
-    except Exception as e:
-        return {
-            "error": f"Failed to read image: {e}",
-            "quote": "Unavailable",
-            "justification": "Image could not be processed"
-        }
+    Returns:
+        tuple: (media_type, base64_data)
+    """
+    return _encode_cached(image_path, os.path.getmtime(image_path))
+
+
+def _copywriter_request(media_type: str, image_data: str, trend_summary: str, model: str) -> dict:
+    """
+    Build the copywriter's messages.create arguments (shared with batch.py).
     
+    Returns:
+        dict: Request parameters (model, max_tokens, system, messages)
+    """
     system_prompt = """You are a luxury brand copywriter specializing in fashion campaigns.
 
 Your task is to create compelling marketing copy that resonates with style-conscious consumers."""
     
-    prompt = f"""I need you to create marketing copy for this sunglasses campaign.
+    # The (large, reusable) research goes first so it can be served from the
+    # prompt cache; the image and the short instructions follow it
+    research = f"""I need you to create marketing copy for this sunglasses campaign.
 
 Here is the market research:
 \"\"\"{trend_summary}\"\"\"
-
-Please analyze the attached campaign image and create:
+"""
+    
+    prompt = f"""Please analyze the attached campaign image and create:
 1. A short, memorable campaign quote (1-2 sentences max)
 2. A justification explaining how the quote connects the visual to the trends
 
@@ -340,15 +668,15 @@ Format your response as JSON:
   "justification": "Why this quote works..."
 }}"""
     
-    # Call Claude with vision
-    response = client.messages.create(
-        model=model,
-        max_tokens=2048,
-        system=system_prompt,
-        messages=[
+    return {
+        "model": model,
+        "max_tokens": 2048,
+        "system": system_prompt,
+        "messages": [
             {
                 "role": "user",
                 "content": [
+                    _text_block(research),
                     {
                         "type": "image",
                         "source": {
@@ -364,29 +692,18 @@ Format your response as JSON:
                 ]
             }
         ]
-    )
-    
-    # Extract response
-    response_text = ""
-    for block in response.content:
-        if hasattr(block, "text"):
-            response_text += block.text
-    
-    utils.log_tool_result_html(response_text)
-    
-    # Parse JSON response
-    try:
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            copy_data = json.loads(json_match.group())
-        else:
-            copy_data = json.loads(response_text)
-        
+    }
+
+
+def _parse_copy(response_text: str) -> dict:
+    """Read the copywriter's quote/justification JSON, with text fallbacks."""
+    copy_data = _load_json_object(response_text)
+    if copy_data is not None:
         return {
             "quote": copy_data.get("quote", "Experience the moment."),
             "justification": copy_data.get("justification", "This quote captures the essence of the campaign.")
         }
-    except json.JSONDecodeError:
+    else:
         # Fallback
         return {
             "quote": response_text[:200] if response_text else "Experience the moment.",
@@ -394,84 +711,164 @@ Format your response as JSON:
         }
 
 
-# =========================
-# AGENT 4: Packaging Agent
-# =========================
-
-def packaging_agent(
+# Near-identical research for the very same image reuses the quote
+@semantic_cache(namespace="copywriter", text_arg="trend_summary", image_arg="image_path", threshold=0.95)
+async def copywriter_agent(
+    image_path: str,
     trend_summary: str,
-    image_url: str,
-    quote: str,
-    justification: str,
-    output_path: str = "campaign_summary.md",
-    model: str = "claude-sonnet-4-20250514"
-) -> str:
+    model: str = clients.MODEL_TIERS["vision"]
+) -> dict:
     """
-    Creates an executive-ready markdown report with all campaign materials.
+    Generates a campaign quote by analyzing the image and trends using Claude's vision capabilities.
     
     Args:
+        image_path: Path to campaign image
         trend_summary: Market research findings
-        image_url: Path to campaign image
-        quote: Campaign quote
-        justification: Why the campaign works
-        output_path: Where to save markdown file
         model: Claude model to use
         
     Returns:
-        str: Path to saved markdown file
+        dict: Contains quote and justification
     """
     
-    utils.log_agent_title_html("Packaging Agent", "📦")
+    utils.log_agent_title_html("Copywriter Agent", "✍️")
     
-    # Beautify the trend summary for executives
-    response = client.messages.create(
-        model=model,
-        max_tokens=2048,
-        system="You are a marketing communication expert writing elegant campaign summaries for executives.",
-        messages=[
+    # Reject formats Claude can't read before paying for a vision call
+    if _image_media_type(image_path) is None:
+        return {
+            "error": f"Unsupported image type {mimetypes.guess_type(image_path)[0]}",
+            "quote": "Unavailable",
+            "justification": "Image could not be processed"
+        }
+    
+    # Read and encode image
+    try:
+        # In a worker thread so the file read doesn't block the event loop
+        media_type, image_data = await asyncio.to_thread(_encode_image, image_path)
+    except Exception as e:
+        return {
+            "error": f"Failed to read image: {e}",
+            "quote": "Unavailable",
+            "justification": "Image could not be processed"
+        }
+    
+    # Call Claude with vision (streamed)
+    response_text, response = await _stream_text(
+        **_copywriter_request(media_type, image_data, trend_summary, model)
+    )
+    _log_cache_usage("Copywriter", response)
+    
+    utils.log_tool_result_html(response_text)
+    
+    # Parse JSON response
+    return _parse_copy(response_text)
+
+
+# =========================
+# AGENT 4: Packaging Agent
+# =========================
+
+def _beautify_request(trend_summary: str, model: str) -> dict:
+    """Build the executive-summary rewrite's messages.create arguments (shared with batch.py)."""
+    return {
+        "model": model,
+        "max_tokens": 2048,
+        "system": "You are a marketing communication expert writing elegant campaign summaries for executives.",
+        "messages": [
             {
                 "role": "user",
-                "content": f"""Please rewrite the following trend summary to be clear, professional, and engaging for a CEO audience:
+                "content": [
+                    _text_block(f"""Please rewrite the following trend summary to be clear, professional, and engaging for a CEO audience:
 
 \"\"\"{trend_summary.strip()}\"\"\"
 
-Keep it concise but impactful."""
+Keep it concise but impactful.""")
+                ]
             }
         ]
-    )
+    }
+
+
+async def _beautify_summary(trend_summary: str, model: str = clients.MODEL_TIERS["fast"]) -> str:
+    """
+    Rewrite the trend summary for an executive audience.
     
-    beautified_summary = ""
-    for block in response.content:
-        if hasattr(block, "text"):
-            beautified_summary += block.text
+    Only depends on the trend summary, so the pipeline runs it alongside
+    the copywriter. The result is cached under the hash of its inputs, so the
+    pipeline and packaging_agent both skip the rewrite for a summary seen before.
     
-    utils.log_tool_result_html(beautified_summary)
+    Args:
+        trend_summary: Market research findings
+        model: Claude model to use
+        
+    Returns:
+        str: Beautified summary
+    """
+    key = hashlib.sha256(f"{model}\0{trend_summary}".encode("utf-8")).hexdigest()[:16]
+    cached_summary = _asset_path("summaries", key, ".md")
+    if cached_summary is not None and os.path.exists(cached_summary):
+        with open(cached_summary, encoding="utf-8") as f:
+            beautified_summary = f.read()
+        utils.log_tool_result_html(f"🗄️ Reused cached executive summary\n\n{beautified_summary}")
+        return beautified_summary
     
-    # Create styled image reference
-    styled_image_html = f"""
-![Campaign Visual]({image_url})
-"""
+    beautified_summary, response = await _stream_text(**_beautify_request(trend_summary, model))
+    _log_cache_usage("Packaging", response)
     
-    # Combine all parts into markdown
-    markdown_content = f"""# 🕶️ Summer Sunglasses Campaign – Executive Summary
+    # Only complete rewrites are worth replaying
+    if cached_summary is not None and response.stop_reason == "end_turn" and beautified_summary.strip():
+        os.makedirs(os.path.dirname(cached_summary), exist_ok=True)
+        with open(cached_summary, "w", encoding="utf-8") as f:
+            f.write(beautified_summary)
+    
+    utils.log_tool_result_html(beautified_summary)
+    return beautified_summary
+
+
+# Report layout, parsed once at import; only the substitution runs per call
+_REPORT_TEMPLATE = string.Template("""# 🕶️ Summer Sunglasses Campaign – Executive Summary
 
 ## 📊 Refined Trend Insights
-{beautified_summary.strip()}
+$beautified
 
 ## 🎯 Campaign Visual
-{styled_image_html}
+
+![Campaign Visual]($image_url)
+
 
 ## ✍️ Campaign Quote
-{quote.strip()}
+$quote
 
 ## ✅ Why This Works
-{justification.strip()}
+$justification
 
 ---
 
-*Report generated on {datetime.now().strftime('%Y-%m-%d at %H:%M:%S')}*
+*Report generated on $generated*
 *Powered by Claude (Anthropic) Multi-Agent Workflow*
-"""
+""")
+
+
+def _assemble_markdown(
+    beautified_summary: str,
+    image_url: str,
+    quote: str,
+    justification: str,
+    output_path: str
+) -> str:
+    """
+    Combine all campaign materials into the markdown report and save it.
+    
+    Returns:
+        str: Path to saved markdown file
+    """
+    # Combine all parts into markdown
+    markdown_content = _REPORT_TEMPLATE.substitute(
+        beautified=beautified_summary.strip(),
+        image_url=image_url,
+        quote=quote.strip(),
+        justification=justification.strip(),
+        generated=datetime.now().strftime('%Y-%m-%d at %H:%M:%S')
+    )
     
     # Save to file
     with open(output_path, "w", encoding="utf-8") as f:
@@ -482,13 +879,44 @@ Keep it concise but impactful."""
     return output_path
 
 
+async def packaging_agent(
+    trend_summary: str,
+    image_url: str,
+    quote: str,
+    justification: str,
+    output_path: str = "campaign_summary.md",
+    model: str = clients.MODEL_TIERS["fast"]
+) -> str:
+    """
+    Creates an executive-ready markdown report with all campaign materials.
+    
+    Args:
+        trend_summary: Market research findings
+        image_url: Path to campaign image
+        quote: Campaign quote
+        justification: Why the campaign works
+        output_path: Where to save markdown file
+        model: Claude model to use
+        
+    Returns:
+        str: Path to saved markdown file
+    """
+    
+    utils.log_agent_title_html("Packaging Agent", "📦")
+    
+    # Beautify the trend summary for executives (cached per summary)
+    beautified_summary = await _beautify_summary(trend_summary, model=model)
+    
+    return _assemble_markdown(beautified_summary, image_url, quote, justification, output_path)
+
+
 # =========================
 # Full Campaign Pipeline
 # =========================
 
-def run_sunglasses_campaign_pipeline(
+async def run_sunglasses_campaign_pipeline(
     output_path: str = None,
-    model: str = "claude-sonnet-4-20250514"
+    model: str = None
 ) -> dict:
     """
     Runs the full summer sunglasses campaign pipeline:
@@ -499,12 +927,16 @@ def run_sunglasses_campaign_pipeline(
     
     Args:
         output_path: Custom path for markdown report
-        model: Claude model to use
+        model: Claude model for every agent (default: each agent's tier from
+            clients.MODEL_TIERS; pass a model to escalate)
         
     Returns:
         dict: Dictionary containing all intermediate results + path to final report
     """
     
+    # Per-agent tier defaults unless the caller overrides the model
+    overrides = {"model": model} if model else {}
+    
     if output_path is None:
         output_path = f"campaign_summary_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.md"
     
@@ -514,12 +946,12 @@ def run_sunglasses_campaign_pipeline(
     
     # 1. Run market research agent
     print("\n[1/4] Running Market Research Agent...")
-    trend_summary = market_research_agent(model=model)
+    trend_summary = await market_research_agent(**overrides)
     print("✅ Market research completed")
     
     # 2. Generate image + caption
     print("\n[2/4] Running Graphic Designer Agent...")
-    visual_result = graphic_designer_agent(trend_insights=trend_summary, model=model)
+    visual_result = await graphic_designer_agent(trend_insights=trend_summary, **overrides)
     image_path = visual_result.get("image_path", "")
     
     if "error" in visual_result:
@@ -528,13 +960,19 @@ def run_sunglasses_campaign_pipeline(
     else:
         print("🖼️ Image generated successfully")
     
-    # 3. Generate quote based on image + trends
-    print("\n[3/4] Running Copywriter Agent...")
+    # 3 + 4. Quote and executive summary are independent of each other, so the
+    # copywriter and the beautify call run at the same time
+    print("\n[3/4] Running Copywriter Agent (executive summary drafted in parallel)...")
+    beautify_task = asyncio.create_task(_beautify_summary(trend_summary, **overrides))
+    
     if image_path and os.path.exists(image_path):
-        quote_result = copywriter_agent(
-            image_path=image_path,
-            trend_summary=trend_summary,
-            model=model
+        quote_result, beautified_summary = await asyncio.gather(
+            copywriter_agent(
+                image_path=image_path,
+                trend_summary=trend_summary,
+                **overrides
+            ),
+            beautify_task
         )
         quote = quote_result.get("quote", "Experience the moment.")
         justification = quote_result.get("justification", "Campaign analysis.")
@@ -543,16 +981,16 @@ def run_sunglasses_campaign_pipeline(
         quote = "Experience the trend."
         justification = "Image unavailable for analysis."
         print("⚠️ Skipping copywriter (no image available)")
+        beautified_summary = await beautify_task
     
-    # 4. Generate markdown report
     print("\n[4/4] Running Packaging Agent...")
-    md_path = packaging_agent(
-        trend_summary=trend_summary,
+    utils.log_agent_title_html("Packaging Agent", "📦")
+    md_path = _assemble_markdown(
+        beautified_summary,
         image_url=image_path if image_path else "image_unavailable.png",
         quote=quote,
         justification=justification,
-        output_path=output_path,
-        model=model
+        output_path=output_path
     )
     print(f"📦 Report generated: {md_path}")
     
@@ -572,7 +1010,9 @@ def run_sunglasses_campaign_pipeline(
 # Example Usage
 # =========================
 
-if __name__ == "__main__":
+async def _examples():
+    """Run the example agents on one event loop (the async client's connection
+    pool is bound to the loop it was first used on)."""
     print("""
 ╔══════════════════════════════════════════════════════════════════════════════╗
 ║                  MULTI-AGENT SUNGLASSES CAMPAIGN PIPELINE                    ║
@@ -595,7 +1035,7 @@ Note: Requires both ANTHROPIC_API_KEY and OPENAI_API_KEY (for DALL-E image gener
     
     # Test market research agent
     print("\n--- Testing Market Research Agent ---")
-    research_result = market_research_agent()
+    research_result = await market_research_agent()
     print(f"\nResult preview: {research_result[:200]}...")
     
     # Run full pipeline
@@ -604,24 +1044,28 @@ Note: Requires both ANTHROPIC_API_KEY and OPENAI_API_KEY (for DALL-E image gener
     print("=" * 80)
     
     try:
-        results = run_sunglasses_campaign_pipeline()
-        
+        results = await run_sunglasses_campaign_pipeline()
+    
         print("\n📄 Campaign Summary:")
         print(f"- Markdown report: {results['markdown_path']}")
         print(f"- Image: {results['visual'].get('image_path', 'N/A')}")
         print(f"- Quote: {results['quote'].get('quote', 'N/A')[:100]}...")
-        
+    
         # Display the markdown content
         print("\n" + "=" * 80)
         print("FINAL REPORT PREVIEW")
         print("=" * 80)
-        
+    
         with open(results["markdown_path"], "r", encoding="utf-8") as f:
             print(f.read())
-            
+        
     except Exception as e:
         print(f"\n❌ Pipeline failed: {e}")
         print("Make sure you have:")
         print("1. ANTHROPIC_API_KEY in your .env file")
         print("2. OPENAI_API_KEY in your .env file (for DALL-E)")
-        print("3. tools_multi_agent.py and utils_multi_agent.py modules")
\ No newline at end of file
+        print("3. tools_multi_agent.py and utils_multi_agent.py modules")
+
+
+if __name__ == "__main__":
+    asyncio.run(_examples())
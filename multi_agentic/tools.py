@@ -1,11 +1,15 @@
 import requests
 import os
-import json
+import sys
+import orjson
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
 from dotenv import load_dotenv
-from tavily import TavilyClient
-import pandas as pd
 
-from inventory_utils import create_inventory_dataframe
+# clients lives in the repo root, one level up (appended, so local modules win)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import clients
 
 # Session setup (optional)
 session = requests.Session()
@@ -31,7 +35,7 @@ def tavily_search_tool(query: str, max_results: int = 5, include_images: bool =
     if api_base_url:
         params['api_base_url'] = api_base_url
 
-    client = TavilyClient(api_key=api_key, api_base_url=api_base_url)
+    client = clients.tavily_client(api_key, api_base_url)
 
     try:
         response = client.search(
@@ -56,58 +60,106 @@ def tavily_search_tool(query: str, max_results: int = 5, include_images: bool =
 
     except Exception as e:
         return [{"error": str(e)}]
+
+
+# Shared pool for fanned-out searches (Tavily calls are network-bound)
+_search_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def tavily_search_many(queries: list[str], max_results: int = 5) -> list[list[dict]]:
+    """
+    Run several Tavily searches concurrently.
+
+    Args:
+        queries: Search queries
+        max_results: Max results per query
+
+    Returns:
+        list: One tavily_search_tool result list per query, in the same order
+    """
+    return list(_search_executor.map(lambda query: tavily_search_tool(query, max_results=max_results), queries))
     
 
-def product_catalog_tool(max_items: int = 10) -> list[dict[str, str]]:
-    inventory_df = create_inventory_dataframe()
-    return inventory_df.head(max_items).to_dict(orient="records")
+@functools.cache
+def _inventory_records() -> tuple:
+    """
+    Inventory rows, built from the DataFrame once and reused by every call.
+
+    pandas and inventory_utils are only imported here, so processes that
+    only use the sunglasses catalog never pay for them.
+    """
+    from inventory_utils import create_inventory_dataframe
+
+    return tuple(create_inventory_dataframe().to_dict(orient="records"))
+
+
+def inventory_catalog_tool(max_items: int = 10) -> list[dict[str, str]]:
+    """Returns up to max_items rows of the inventory DataFrame (opt-in: get_available_tools(include_inventory=True))."""
+    return list(_inventory_records()[:max_items])
 
 
 # 🧠 TOOL METADATA FOR LLM
 
-def get_available_tools():
-    return [
-        {
-            "type": "function",
-            "function": {
-                "name": "tavily_search_tool",
-                "description": "Perform web search for sunglasses trends using Tavily.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "query": {"type": "string", "description": "Search query"},
-                        "max_results": {"type": "integer", "default": 5},
-                        "include_images": {"type": "boolean", "default": False}
-                    },
-                    "required": ["query"]
-                }
+# Built once at import; the SDKs only read the schemas
+_TOOLS_OPENAI = [
+    {
+        "type": "function",
+        "function": {
+            "name": "tavily_search_tool",
+            "description": "Perform web search for sunglasses trends using Tavily.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "Search query"},
+                    "max_results": {"type": "integer", "default": 5},
+                    "include_images": {"type": "boolean", "default": False}
+                },
+                "required": ["query"]
             }
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "product_catalog_tool",
-                "description": "Get sunglasses products from internal inventory.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "max_items": {"type": "integer", "default": 10}
-                    }
-                }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "product_catalog_tool",
+            "description": "Access internal sunglasses product catalog.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    }
+]
+
+# Needs inventory_utils (and pandas), so only advertised on request
+_INVENTORY_TOOL_OPENAI = {
+    "type": "function",
+    "function": {
+        "name": "inventory_catalog_tool",
+        "description": "Get sunglasses products from internal inventory.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "max_items": {"type": "integer", "default": 10}
             }
         }
-    ]
+    }
+}
+
+
+def get_available_tools(include_inventory: bool = False):
+    if include_inventory:
+        return [*_TOOLS_OPENAI, _INVENTORY_TOOL_OPENAI]
+    return _TOOLS_OPENAI
 
 
 # 🔁 TOOL CALL DISPATCHER
 
 def handle_tool_call(tool_call):
     function_name = tool_call.function.name
-    arguments = json.loads(tool_call.function.arguments)
+    arguments = orjson.loads(tool_call.function.arguments)
 
     tools_map = {
         "tavily_search_tool": tavily_search_tool,
         "product_catalog_tool": product_catalog_tool,
+        "inventory_catalog_tool": inventory_catalog_tool,
     }
 
     return tools_map[function_name](**arguments)
@@ -118,7 +170,7 @@ def create_tool_response_message(tool_call, tool_result):
         "role": "tool",
         "tool_call_id": tool_call.id,
         "name": tool_call.function.name,
-        "content": json.dumps(tool_result)
+        "content": orjson.dumps(tool_result).decode()
     }
 
 # Add these to your existing tools.py file
@@ -191,57 +243,88 @@ SUNGLASSES_CATALOG = [
 ]
 
 
+# The catalog is static, so the tool response is built once
+_CATALOG_RESPONSE = {
+    "source": "Internal Product Catalog",
+    "total_products": len(SUNGLASSES_CATALOG),
+    "products": SUNGLASSES_CATALOG,
+    "metadata": {
+        "last_updated": "2025-01-15",
+        "currency": "USD"
+    }
+}
+
+
 def product_catalog_tool() -> dict:
-    """Returns the internal sunglasses product catalog."""
-    return {
-        "source": "Internal Product Catalog",
-        "total_products": len(SUNGLASSES_CATALOG),
-        "products": SUNGLASSES_CATALOG,
-        "metadata": {
-            "last_updated": "2025-01-15",
-            "currency": "USD"
+    """Returns the internal sunglasses product catalog (shared object, do not mutate)."""
+    return _CATALOG_RESPONSE
+
+
+# Claude tool definitions, built once at import (read-only)
+_TOOLS_CLAUDE = tuple(MappingProxyType(tool) for tool in [
+    {
+        "name": "tavily_search_tool",
+        "description": "Search the web for fashion trends and market information.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Search query"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Max results (default: 5)",
+                    "default": 5
+                }
+            },
+            "required": ["query"]
+        }
+    },
+    {
+        "name": "tavily_multi_search",
+        "description": "Run several web searches at once. Prefer this over repeated tavily_search_tool calls when you have more than one query.",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "queries": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "description": "Search queries"
+                },
+                "max_results": {
+                    "type": "integer",
+                    "description": "Max results per query (default: 5)",
+                    "default": 5
+                }
+            },
+            "required": ["queries"]
+        }
+    },
+    {
+        "name": "product_catalog_tool",
+        "description": "Access internal sunglasses product catalog.",
+        "input_schema": {
+            "type": "object",
+            "properties": {},
+            "required": []
         }
     }
+])
 
 
 def get_available_tools_claude():
-    """Get tool definitions for Claude format."""
-    return [
-        {
-            "name": "tavily_search_tool",
-            "description": "Search the web for fashion trends and market information.",
-            "input_schema": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "Search query"
-                    },
-                    "max_results": {
-                        "type": "integer",
-                        "description": "Max results (default: 5)",
-                        "default": 5
-                    }
-                },
-                "required": ["query"]
-            }
-        },
-        {
-            "name": "product_catalog_tool",
-            "description": "Access internal sunglasses product catalog.",
-            "input_schema": {
-                "type": "object",
-                "properties": {},
-                "required": []
-            }
-        }
-    ]
+    """Get tool definitions for Claude format (shared, read-only)."""
+    return _TOOLS_CLAUDE
 
 
 def handle_tool_call_claude(tool_name: str, tool_input: dict):
     """Handle tool calls for Claude."""
     if tool_name == "tavily_search_tool":
         return tavily_search_tool(**tool_input)
+    elif tool_name == "tavily_multi_search":
+        results = tavily_search_many(**tool_input)
+        return [{"query": query, "results": result} for query, result in zip(tool_input["queries"], results)]
     elif tool_name == "product_catalog_tool":
         return product_catalog_tool()
     else:
@@ -5,15 +5,26 @@ Graded Lab: Reflection in a Research Agent (Local Runner)
 This script is self-contained and runnable locally:
 - Uses .env for OPENAI_API_KEY if you want real LLM calls.
 - Prefers `aisuite` client; falls back to OpenAI SDK; finally a dummy offline shim.
+- Caches completions by prompt hash (LLM_CACHE=off to disable).
 
 pip install -q python-dotenv
 # Optional depending on your setup:
 pip install -q openai
 pip install -q aisuite
+pip install -q diskcache  # persistent response cache
 """
 
+import asyncio
+import functools
+import hashlib
 import os
-from typing import Any
+import statistics
+import time
+import weakref
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass
+from typing import Any, Callable
 
 # 1) .env setup
 try:
@@ -24,10 +35,6 @@ except Exception:
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
-# 2) Client resolution order: aisuite -> openai -> dummy
-CLIENT = None
-_backend = "dummy"
-
 # ---- Shim response objects (mimic OpenAI/aisuite shape) ----
 class _ShimMessage:
     def __init__(self, content: str):
@@ -41,182 +48,494 @@ class _ShimResponse:
     def __init__(self, content: str):
         self.choices = [_ShimChoice(content)]
 
-# ---- aisuite (preferred if available) ----
-try:
-    import aisuite as ai  # type: ignore
+# ---- OpenAI SDK wrapper ----
+def _normalize_model(model: str) -> str:
+    # Allow "openai:gpt-4o" style; strip "openai:" prefix if present
+    return model.split(":", 1)[1] if model.startswith("openai:") else model
+
+@dataclass(slots=True)
+class _Completions:
+    create: Callable[..., Any]
+
+@dataclass(slots=True)
+class _Chat:
+    completions: _Completions
+
+class _OpenAIChatWrapper:
+    """Wrap OpenAI client to look like aisuite's chat.completions.create."""
+    __slots__ = ("_client", "chat")
+
+    def __init__(self, openai_client):
+        self._client = openai_client
+        # expose .chat.completions.create(...)
+        self.chat = _Chat(completions=_Completions(create=self.create))
+
+    def create(self, model: str, messages: list[dict], temperature: float = 1.0):
+        model = _normalize_model(model)
+        try:
+            return self._client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+            )
+        except Exception as e:
+            # Return shim response to keep tests running locally
+            fallback = (
+                "[FALLBACK due to OpenAI error: "
+                + str(e)
+                + "]\n\n"
+                + (messages[-1]["content"] if messages else "")
+            )
+            return _ShimResponse(fallback)
 
-    CLIENT = ai.Client()
-    _backend = "aisuite"
-except Exception:
-    CLIENT = None
+# ---- Dummy offline fallback ----
+class _DummyCompletions:
+    def create(self, model: str, messages: list[dict], temperature: float = 1.0) -> Any:
+        # Deterministic offline content so functions return strings without raising
+        last = messages[-1]["content"] if messages else ""
+        canned = (
+            "This is a dummy offline response for local testing.\n\n"
+            "Echo of your prompt (truncated to 600 chars):\n"
+            + last[:600]
+        )
+        return _ShimResponse(canned)
+
+class _DummyChat:
+    completions = _DummyCompletions()
+
+class _DummyClient:
+    chat = _DummyChat()
+
+# ---- Pooled HTTP/2 transport for the OpenAI SDK ----
+def _openai_http_client(asynchronous: bool = False) -> Any:
+    """
+    Keep-alive httpx client (HTTP/2, idle connections kept for a minute) so
+    consecutive calls reuse one TCP+TLS connection. None when httpx/h2 are
+    unavailable: the SDK then builds its default client.
+    """
+    try:
+        import httpx  # type: ignore
+        import openai  # type: ignore
+
+        limits = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60)
+        factory = openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+        return factory(http2=True, limits=limits)
+    except Exception:
+        return None
+
+# 2) Client resolution order: aisuite -> openai -> dummy
+@functools.lru_cache(maxsize=1)
+def get_client() -> tuple[Any, str]:
+    """
+    Resolve the chat client once, on first use (so importing this module
+    doesn't import aisuite/openai). Returns (client, backend_name).
+    """
+    # ---- aisuite (preferred if available) ----
+    try:
+        import aisuite as ai  # type: ignore
 
-# ---- OpenAI SDK fallback ----
-if CLIENT is None:
+        return ai.Client(), "aisuite"
+    except Exception:
+        pass
+
+    # ---- OpenAI SDK fallback ----
     try:
         from openai import OpenAI  # type: ignore
 
-        _openai_client = OpenAI(api_key=OPENAI_API_KEY or None)
-
-        class _OpenAIChatWrapper:
-            """Wrap OpenAI client to look like aisuite's chat.completions.create."""
-            def __init__(self, openai_client):
-                self._client = openai_client
-                # expose .chat.completions.create(...)
-                self.chat = type(
-                    "ChatObj",
-                    (),
-                    {"completions": type("CompletionsObj", (), {"create": self.create})()},
-                )()
-
-            def _normalize_model(self, model: str) -> str:
-                # Allow "openai:gpt-4o" style; strip "openai:" prefix if present
-                return model.split(":", 1)[1] if model.startswith("openai:") else model
-
-            def create(self, model: str, messages: list[dict], temperature: float = 1.0):
-                model = self._normalize_model(model)
-                try:
-                    return self._client.chat.completions.create(
-                        model=model,
-                        messages=messages,
-                        temperature=temperature,
-                    )
-                except Exception as e:
-                    # Return shim response to keep tests running locally
-                    fallback = (
-                        "[FALLBACK due to OpenAI error: "
-                        + str(e)
-                        + "]\n\n"
-                        + (messages[-1]["content"] if messages else "")
-                    )
-                    return _ShimResponse(fallback)
-
-        CLIENT = _OpenAIChatWrapper(_openai_client)
-        _backend = "openai"
+        openai_client = OpenAI(api_key=OPENAI_API_KEY or None, http_client=_openai_http_client())
+        return _OpenAIChatWrapper(openai_client), "openai"
     except Exception:
-        CLIENT = None
+        pass
 
-# ---- Dummy offline fallback ----
-if CLIENT is None:
-    class _DummyCompletions:
-        def create(self, model: str, messages: list[dict], temperature: float = 1.0) -> Any:
-            # Deterministic offline content so functions return strings without raising
-            last = messages[-1]["content"] if messages else ""
-            canned = (
-                "This is a dummy offline response for local testing.\n\n"
-                "Echo of your prompt (truncated to 600 chars):\n"
-                + last[:600]
-            )
-            return _ShimResponse(canned)
+    return _DummyClient(), "dummy"
 
-    class _DummyChat:
-        completions = _DummyCompletions()
 
-    class _DummyClient:
-        chat = _DummyChat()
+def __getattr__(name: str) -> Any:
+    # Backwards compatible `reflection_lab.CLIENT`, resolved lazily
+    if name == "CLIENT":
+        return get_client()[0]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# -----------------------------
+# Hedged requests (cut tail latency)
+# -----------------------------
+_HEDGE_POOL = ThreadPoolExecutor(max_workers=8)
+_HEDGE_DEFAULT_DELAY = 20.0  # Seconds, until enough latencies have been observed
+_latencies: deque = deque(maxlen=50)
+
+
+def _hedge_delay() -> float:
+    """
+    95th percentile of recent call latencies: only the slow tail gets a
+    second request, so hedging costs ~5% extra calls rather than doubling them.
+    """
+    if len(_latencies) < 10:
+        return _HEDGE_DEFAULT_DELAY
+    return statistics.quantiles(_latencies, n=20)[-1]
+
+
+def _timed_create(client: Any, **kwargs) -> Any:
+    started = time.perf_counter()
+    response = client.chat.completions.create(**kwargs)
+    _latencies.append(time.perf_counter() - started)
+    return response
+
+
+def _hedged_create(client: Any, delay: float | None = None, **kwargs) -> Any:
+    """
+    chat.completions.create that fires an identical backup request if the
+    first one hasn't answered (or has failed) after `delay` seconds, and
+    returns the first successful response (the other request is left to
+    complete in the background). If both fail, the primary's outcome is returned.
+    """
+    first = _HEDGE_POOL.submit(_timed_create, client, **kwargs)
+    done, _ = wait([first], timeout=_hedge_delay() if delay is None else delay)
+    if done and not _failed(first):
+        return first.result()
+    backup = _HEDGE_POOL.submit(_timed_create, client, **kwargs)
+    for future in as_completed([first, backup]):
+        if not _failed(future):
+            return future.result()
+    return first.result()
+
+
+def _failed(future: Future) -> bool:
+    """A finished request that raised or came back as the wrapper's FALLBACK shim."""
+    if future.exception() is not None:
+        return True
+    content = _message_content(future.result(), None)
+    return isinstance(content, str) and content.startswith("[FALLBACK")
 
-    CLIENT = _DummyClient()
-    _backend = "dummy"
 
 # -----------------------------
-# GRADED FUNCTION: generate_draft
+# Response cache (prompt hash -> completion text)
 # -----------------------------
-def generate_draft(topic: str, model: str = "openai:gpt-4o") -> str:
-    ### START CODE HERE ###
-    # Coerce topic to a safe string and provide a fallback to avoid null content
-    topic_text = (str(topic).strip() if topic is not None else "")
-    if not topic_text:
-        topic_text = "The importance of clear writing in modern communication"
+# Two levels: an in-process LRU in front of a diskcache directory, so
+# re-running the tests or the demo replays identical prompts for free.
+# LLM_CACHE=off disables it, LLM_CACHE=memory keeps it in-process only.
+_MEMORY_CACHE_SIZE = 256
+_memory_cache: OrderedDict = OrderedDict()
 
-    prompt = (
-        f"Write a complete, well-structured essay about the following topic: {topic_text}\n\n"
-        "The essay should include:\n"
-        "- An introduction with a clear thesis statement\n"
-        "- Body paragraphs with supporting arguments and examples\n"
-        "- A conclusion that summarizes the main points\n\n"
-        "Please write a comprehensive essay of at least 4–5 paragraphs."
-    )
-    ### END CODE HERE ###
 
-    response = CLIENT.chat.completions.create(
+def _cache_mode() -> str:
+    # The dummy backend's canned output must never be replayed for a real model
+    if get_client()[1] == "dummy":
+        return "off"
+    return os.getenv("LLM_CACHE", "disk").lower()
+
+
+@functools.lru_cache(maxsize=1)
+def _disk_cache() -> Any:
+    try:
+        import diskcache  # type: ignore
+
+        return diskcache.Cache(os.getenv("LLM_CACHE_DIR", ".llm_cache"))
+    except Exception:
+        return None
+
+
+def _cache_key(model: str, prompt: str) -> str:
+    return "reflection:" + hashlib.blake2b(f"{model}|{prompt}".encode("utf-8")).hexdigest()
+
+
+def _memory_put(key: str, content: str) -> None:
+    _memory_cache[key] = content
+    _memory_cache.move_to_end(key)
+    while len(_memory_cache) > _MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+def _cache_get(model: str, prompt: str) -> str | None:
+    mode = _cache_mode()
+    if mode == "off":
+        return None
+    key = _cache_key(model, prompt)
+    content = _memory_cache.get(key)
+    if content is not None:
+        _memory_cache.move_to_end(key)
+        return content
+    disk = _disk_cache() if mode == "disk" else None
+    content = disk.get(key) if disk is not None else None
+    if content is not None:
+        _memory_put(key, content)
+    return content
+
+
+def _cache_put(model: str, prompt: str, response: Any) -> None:
+    mode = _cache_mode()
+    content = _message_content(response, None)
+    # Errors come back as shim FALLBACK text: don't keep those
+    if mode == "off" or not isinstance(content, str) or content.startswith("[FALLBACK"):
+        return
+    key = _cache_key(model, prompt)
+    _memory_put(key, content)
+    disk = _disk_cache() if mode == "disk" else None
+    if disk is not None:
+        disk.set(key, content)
+
+
+def _cached_create(client: Any, model: str, prompt: str, temperature: float = 1.0) -> Any:
+    """Serve a repeated (model, prompt) from the cache, else a hedged API call."""
+    content = _cache_get(model, prompt)
+    if content is not None:
+        return _ShimResponse(content)
+    response = _hedged_create(
+        client,
         model=model,
         messages=[{"role": "user", "content": prompt}],
-        temperature=1.0,
+        temperature=temperature,
     )
-    # Be defensive in case a backend returns a different shape
-    try:
-        return response.choices[0].message.content
-    except Exception:
-        return "Draft (fallback): An essay discussing the topic with introduction, body, and conclusion."
+    _cache_put(model, prompt, response)
+    return response
 
 # -----------------------------
-# GRADED FUNCTION: reflect_on_draft
+# Prompts & response parsing (shared by the sync and async functions)
 # -----------------------------
-def reflect_on_draft(draft: str, model: str = "openai:o4-mini") -> str:
-    ### START CODE HERE ###
-    draft_text = (str(draft) if draft is not None else "")
-
-    prompt = f"""Please provide constructive feedback on the following essay draft.
+_DRAFT_FALLBACK = "Draft (fallback): An essay discussing the topic with introduction, body, and conclusion."
+_FEEDBACK_FALLBACK = "Feedback (fallback): Improve thesis clarity, tighten topic sentences, add evidence, and refine transitions."
+_REVISION_FALLBACK = (
+    "Revised Essay (fallback): This revision clarifies the thesis, organizes body paragraphs with "
+    "clear topic sentences and evidence, and concludes by synthesizing the central claims."
+)
+
+
+# Fixed template text around the variable slot, built once at import
+_DRAFT_HEAD = "Write a complete, well-structured essay about the following topic: "
+_DRAFT_TAIL = (
+    "\n\n"
+    "The essay should include:\n"
+    "- An introduction with a clear thesis statement\n"
+    "- Body paragraphs with supporting arguments and examples\n"
+    "- A conclusion that summarizes the main points\n\n"
+    "Please write a comprehensive essay of at least 4–5 paragraphs."
+)
+
+_REFLECTION_HEAD = """Please provide constructive feedback on the following essay draft.
 Analyze its structure, clarity, strength of arguments, and writing style.
 Point out any areas that need improvement, including grammar or spelling errors.
 
 Draft to review:
-{draft_text}
+"""
+_REFLECTION_TAIL = """
 
 Provide your feedback in a constructive and professional manner (one cohesive paragraph)."""
-    ### END CODE HERE ###
 
-    response = CLIENT.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=1.0,
-    )
+_REVISION_HEAD = """You are tasked with revising an essay based on constructive feedback.
+
+Original Draft:
+"""
+_REVISION_MIDDLE = """
+
+Feedback:
+"""
+_REVISION_TAIL = """
+
+Please provide a complete revised version of the essay that addresses all the feedback points.
+Improve the structure, clarity, argument strength, and overall flow.
+Return only the revised essay, not any explanations or meta-commentary.
+"""
+
+
+def _draft_prompt(topic: str) -> str:
+    # Coerce topic to a safe string and provide a fallback to avoid null content
+    topic_text = (str(topic).strip() if topic is not None else "")
+    if not topic_text:
+        topic_text = "The importance of clear writing in modern communication"
+
+    return _DRAFT_HEAD + topic_text + _DRAFT_TAIL
+
+
+def _reflection_prompt(draft: str) -> str:
+    draft_text = (str(draft) if draft is not None else "")
+
+    return _REFLECTION_HEAD + draft_text + _REFLECTION_TAIL
+
+
+def _revision_prompt(original_draft: str, reflection: str) -> str:
+    orig = str(original_draft) if original_draft is not None else ""
+    fb = str(reflection) if reflection is not None else ""
+
+    return "".join((_REVISION_HEAD, orig, _REVISION_MIDDLE, fb, _REVISION_TAIL))
+
+
+def _message_content(response: Any, fallback: str) -> str:
+    # Be defensive in case a backend returns a different shape
     try:
         return response.choices[0].message.content
     except Exception:
-        return "Feedback (fallback): Improve thesis clarity, tighten topic sentences, add evidence, and refine transitions."
+        return fallback
+
+# -----------------------------
+# GRADED FUNCTION: generate_draft
+# -----------------------------
+def generate_draft(topic: str, model: str = "openai:gpt-4o") -> str:
+    ### START CODE HERE ###
+    prompt = _draft_prompt(topic)
+    ### END CODE HERE ###
+
+    client, _ = get_client()
+    response = _cached_create(client, model=model, prompt=prompt, temperature=1.0)
+    return _message_content(response, _DRAFT_FALLBACK)
+
+# -----------------------------
+# GRADED FUNCTION: reflect_on_draft
+# -----------------------------
+def reflect_on_draft(draft: str, model: str = "openai:o4-mini") -> str:
+    ### START CODE HERE ###
+    prompt = _reflection_prompt(draft)
+    ### END CODE HERE ###
+
+    client, _ = get_client()
+    response = _cached_create(client, model=model, prompt=prompt, temperature=1.0)
+    return _message_content(response, _FEEDBACK_FALLBACK)
 
 # -----------------------------
 # GRADED FUNCTION: revise_draft
 # -----------------------------
 def revise_draft(original_draft: str, reflection: str, model: str = "openai:gpt-4o") -> str:
     ### START CODE HERE ###
-    orig = str(original_draft) if original_draft is not None else ""
-    fb = str(reflection) if reflection is not None else ""
+    prompt = _revision_prompt(original_draft, reflection)
 
-    # Single f-string (avoids stray f / concatenation issues)
-    prompt = f"""You are tasked with revising an essay based on constructive feedback.
+    client, _ = get_client()
+    response = _cached_create(client, model=model, prompt=prompt, temperature=1.0)
+    ### END CODE HERE ###
 
-Original Draft:
-{orig}
+    return _message_content(response, _REVISION_FALLBACK)
 
-Feedback:
-{fb}
+# -----------------------------
+# Async variants (many essays concurrently)
+# -----------------------------
+# One AsyncOpenAI client per event loop: its keep-alive pool is bound to the
+# loop it was created on, so a later asyncio.run must not reuse it
+_async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def _async_openai_client():
+    """AsyncOpenAI client for the running loop when the OpenAI backend is in use, else None."""
+    if get_client()[1] != "openai":
+        return None
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        try:
+            from openai import AsyncOpenAI  # type: ignore
+        except Exception:
+            return None
+        client = AsyncOpenAI(api_key=OPENAI_API_KEY or None, http_client=_openai_http_client(asynchronous=True))
+        _async_clients[loop] = client
+    return client
+
+
+async def _close_async_client() -> None:
+    """Close the running loop's AsyncOpenAI client (and its connections), if any."""
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def _acreate(model: str, prompt: str, temperature: float = 1.0) -> Any:
+    """
+    Async chat.completions.create on the active backend.
+    Natively async for OpenAI; aisuite and the dummy client run in a worker thread.
+    """
+    content = await asyncio.to_thread(_cache_get, model, prompt)
+    if content is not None:
+        return _ShimResponse(content)
+
+    messages = [{"role": "user", "content": prompt}]
+    async_client = _async_openai_client()
+    if async_client is None:
+        response = await asyncio.to_thread(
+            get_client()[0].chat.completions.create, model=model, messages=messages, temperature=temperature
+        )
+    else:
+        try:
+            response = await async_client.chat.completions.create(
+                model=_normalize_model(model),
+                messages=messages,
+                temperature=temperature,
+            )
+        except Exception as e:
+            # Same shim fallback as the sync wrapper
+            response = _ShimResponse("[FALLBACK due to OpenAI error: " + str(e) + "]\n\n" + prompt)
 
-Please provide a complete revised version of the essay that addresses all the feedback points.
-Improve the structure, clarity, argument strength, and overall flow.
-Return only the revised essay, not any explanations or meta-commentary.
-"""
+    await asyncio.to_thread(_cache_put, model, prompt, response)
+    return response
 
-    response = CLIENT.chat.completions.create(
-        model=model,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=1.0,
-    )
-    ### END CODE HERE ###
 
+class RequestBatcher:
+    """
+    DataLoader-style coalescing of async LLM requests.
+
+    Identical (model, prompt) pairs share one request for as long as it is in
+    flight: later callers await the same future instead of sending a duplicate.
+    Chat completions have no multi-prompt endpoint, so holding prompts back to
+    form a batch wouldn't save a request; each unique prompt is dispatched
+    straight away.
+    """
+
+    def __init__(self, dispatch):
+        self._dispatch = dispatch
+        self._in_flight: dict[tuple[str, str], asyncio.Future] = {}
+        self._loop = None
+
+    async def submit(self, model: str, prompt: str) -> Any:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            # New event loop (e.g. another asyncio.run): start from a clean state
+            self._loop, self._in_flight = loop, {}
+
+        key = (model, prompt)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = self._in_flight[key] = loop.create_task(self._run(key))
+        return await asyncio.shield(future)
+
+    async def _run(self, key: tuple[str, str]) -> Any:
+        try:
+            return await self._dispatch(*key)
+        finally:
+            self._in_flight.pop(key, None)
+
+
+_batcher = RequestBatcher(_acreate)
+
+
+async def agenerate_draft(topic: str, model: str = "openai:gpt-4o") -> str:
+    response = await _batcher.submit(model, _draft_prompt(topic))
+    return _message_content(response, _DRAFT_FALLBACK)
+
+
+async def areflect_on_draft(draft: str, model: str = "openai:o4-mini") -> str:
+    response = await _batcher.submit(model, _reflection_prompt(draft))
+    return _message_content(response, _FEEDBACK_FALLBACK)
+
+
+async def arevise_draft(original_draft: str, reflection: str, model: str = "openai:gpt-4o") -> str:
+    response = await _batcher.submit(model, _revision_prompt(original_draft, reflection))
+    return _message_content(response, _REVISION_FALLBACK)
+
+
+async def reflect_pipeline(topic: str) -> tuple[str, str, str]:
+    """Draft -> feedback -> revision for one topic. Returns (draft, feedback, revised)."""
+    draft = await agenerate_draft(topic)
+    feedback = await areflect_on_draft(draft)
+    revised = await arevise_draft(draft, feedback)
+    return draft, feedback, revised
+
+
+async def run_many(topics: list[str]) -> list[tuple[str, str, str]]:
+    """Run independent reflection pipelines concurrently (results in topic order)."""
     try:
-        return response.choices[0].message.content
-    except Exception:
-        return (
-            "Revised Essay (fallback): This revision clarifies the thesis, organizes body paragraphs with "
-            "clear topic sentences and evidence, and concludes by synthesizing the central claims."
-        )
+        return await asyncio.gather(*(reflect_pipeline(t) for t in topics))
+    finally:
+        await _close_async_client()
 
 # -----------------------------
 # Local test harness (optional)
 # -----------------------------
 def _local_tests():
-    print(f"[Backend in use: {_backend}]")
+    print(f"[Backend in use: {get_client()[1]}]")
     try:
         d = generate_draft("Should social media platforms be regulated by the government?")
         assert isinstance(d, str) and len(d) > 0
@@ -229,6 +548,10 @@ def _local_tests():
         r = revise_draft(d, f)
         assert isinstance(r, str) and len(r) > 0
         print("✅ revise_draft returned a non-empty string")
+
+        results = asyncio.run(run_many(["Remote work", "Public transport"]))
+        assert all(isinstance(x, str) and len(x) > 0 for result in results for x in result)
+        print("✅ run_many returned non-empty strings for every topic")
     except AssertionError as e:
         print("❌ A function returned an empty or non-string value:", e)
     except Exception as e:
@@ -5,9 +5,11 @@ import xml.etree.ElementTree as ET
 # --- Third-party ---
 import requests
 from dotenv import load_dotenv
-from tavily import TavilyClient
 import wikipedia
 
+# --- Local / project ---
+import clients
+
 # Init env
 load_dotenv()  # load variables 
 
@@ -110,7 +112,7 @@ def tavily_search_tool(query: str, max_results: int = 5, include_images: bool =
     if api_base_url:
         params['api_base_url'] = api_base_url
 
-    client = TavilyClient(api_key=api_key, api_base_url=api_base_url)
+    client = clients.tavily_client(api_key, api_base_url)
 
     try:
         response = client.search(
@@ -3,19 +3,14 @@ import warnings
 warnings.filterwarnings('ignore')
 
 # Import required libraries
-import os
-from dotenv import load_dotenv
-from anthropic import Anthropic
 from typing import TypedDict, Annotated
 from langgraph.graph import StateGraph, END
 from langgraph.graph.message import add_messages
 
-# Load environment variables from .env file
-load_dotenv()
+import clients
 
-# Initialize Anthropic client
-client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-MODEL = "claude-3-haiku-20240307"  # Using Claude 3 Haiku (fast and cost-effective)
+client = clients.ANTHROPIC
+MODEL = clients.MODEL_TIERS["fast"]  # Planning/writing/editing are plain text rewrites
 
 # Define the state
 class ResearchState(TypedDict):
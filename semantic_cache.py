@@ -0,0 +1,355 @@
+"""
+semantic_cache.py
+Similarity-based answer cache for near-identical agent tasks.
+
+The exact cache in ``llm_cache`` only helps when a request is byte-for-byte
+identical. This module embeds the *task text* and, when a previous task with
+the same model is close enough (cosine similarity above ``threshold``),
+returns the stored answer without running the agent at all:
+
+    "Research quantum computing"  ~  "Look up quantum computing research"
+
+``semantic_cache(namespace=...)`` wraps an async agent with two tiers: an
+exact tier (hash of the arguments, plus the image bytes for vision agents)
+persisted as JSON under ``~/.cache/agentic_labs``, and the similarity tier
+above on one of its text arguments.
+
+Both heavy dependencies are optional: without ``sentence-transformers`` the
+similarity tier is disabled (every lookup misses); without ``faiss`` a NumPy
+matrix is used as the index. ``LLM_CACHE=off`` disables both tiers.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable
+
+import orjson
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CACHE_DIR = Path.home() / ".cache" / "agentic_labs"
+
+
+def _enabled() -> bool:
+    return os.getenv("LLM_CACHE", "disk").lower() != "off"
+
+
+# =========================
+# Embeddings
+# =========================
+
+@functools.lru_cache(maxsize=1)
+def _encoder():
+    """Load the sentence-transformers model once, or None if unavailable."""
+    if not _enabled():
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("⚠️ sentence-transformers not installed. Semantic cache disabled.")
+        return None
+    try:
+        return SentenceTransformer(EMBEDDING_MODEL)
+    except Exception as e:  # Offline, Hugging Face errors, corrupt download...
+        print(f"⚠️ Could not load {EMBEDDING_MODEL} ({e}). Semantic cache disabled.")
+        return None
+
+
+def embed(texts: list[str]):
+    """
+    Embed ``texts`` into L2-normalized float32 vectors (one row per text).
+
+    Returns:
+        numpy.ndarray or None: None when no encoder is available or encoding fails.
+    """
+    encoder = _encoder()
+    if encoder is None:
+        return None
+    try:
+        return encoder.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype("float32")
+    except Exception as e:
+        print(f"⚠️ Embedding failed ({e}). Semantic cache skipped.")
+        return None
+
+
+# =========================
+# Index
+# =========================
+
+class _NumpyIndex:
+    """Brute-force inner-product index with the subset of the faiss API used here."""
+
+    def __init__(self, dim: int):
+        import numpy as np
+
+        self._np = np
+        self._vectors = np.zeros((0, dim), dtype="float32")
+        self._ids = np.zeros(0, dtype="int64")
+
+    @property
+    def ntotal(self) -> int:
+        return len(self._ids)
+
+    def add_with_ids(self, vectors, ids) -> None:
+        self._vectors = self._np.vstack([self._vectors, vectors])
+        self._ids = self._np.concatenate([self._ids, ids])
+
+    def remove_ids(self, ids) -> None:
+        keep = ~self._np.isin(self._ids, ids)
+        self._vectors, self._ids = self._vectors[keep], self._ids[keep]
+
+    def search(self, queries, k: int):
+        scores = queries @ self._vectors.T
+        order = self._np.argsort(-scores, axis=1)[:, :k]
+        return self._np.take_along_axis(scores, order, axis=1), self._ids[order]
+
+
+def _new_index(dim: int):
+    try:
+        import faiss
+    except ImportError:
+        return _NumpyIndex(dim)
+    return faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+
+
+# =========================
+# Cache
+# =========================
+
+class SemanticCache:
+    """
+    Bounded, thread-safe cache of ``(task_text, scope) -> response``.
+
+    Args:
+        threshold (float): Minimum cosine similarity for a hit
+        max_entries (int): Entries kept before the least recently used is evicted
+    """
+
+    def __init__(self, threshold: float = 0.92, max_entries: int = 256):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._index = None
+        self._entries: OrderedDict[int, tuple[str, str, Any]] = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def search(self, embedding, scope: str):
+        """
+        Find the best stored response for a single ``embedding`` row.
+
+        Args:
+            embedding: Array of shape (1, dim) from ``embed``, or None
+            scope (str): Only entries stored under this scope (e.g. the model) can match
+
+        Returns:
+            Any: The cached response, or None on a miss
+        """
+        if embedding is None:
+            return None
+
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return None
+            # A few neighbours, so an entry from another scope can't hide a match
+            scores, ids = self._index.search(embedding, min(8, self._index.ntotal))
+            for score, entry_id in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is not None and entry[1] == scope:
+                    self._entries.move_to_end(int(entry_id))
+                    print(f"🧭 Semantic cache hit ({float(score):.2f}): {entry[0][:60]!r}")
+                    return entry[2]
+        return None
+
+    def add(self, embedding, task: str, scope: str, response: Any) -> None:
+        """Store ``response`` for ``task`` under its precomputed ``embedding``."""
+        if embedding is None:
+            return
+        import numpy as np
+
+        with self._lock:
+            if self._index is None:
+                self._index = _new_index(embedding.shape[1])
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(embedding, np.array([entry_id], dtype="int64"))
+            self._entries[entry_id] = (task, scope, response)
+
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._index.remove_ids(np.array([evicted], dtype="int64"))
+
+
+# =========================
+# Agent decorator
+# =========================
+
+class _ExactTier:
+    """``key -> result`` dict persisted to ``CACHE_DIR/<namespace>.json``."""
+
+    def __init__(self, namespace: str):
+        self.path = CACHE_DIR / f"{namespace}.json"
+        self._entries: dict[str, dict] | None = None
+
+    def entries(self) -> dict[str, dict]:
+        if self._entries is None:
+            try:
+                self._entries = orjson.loads(self.path.read_bytes())
+            except (FileNotFoundError, orjson.JSONDecodeError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, key: str, ttl: float | None):
+        entry = self.entries().get(key)
+        if entry is None or (ttl is not None and time.time() - entry["created"] > ttl):
+            return None
+        return entry
+
+    def set(self, key: str, entry: dict) -> None:
+        """Store and persist ``entry``; raises TypeError if it is not JSON-serializable."""
+        orjson.dumps(entry)  # Validate before it can poison the persisted file
+        self.entries()[key] = entry
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_bytes(orjson.dumps(self._entries))
+        os.replace(tmp, self.path)
+
+
+# Cleared by skip_store() while a decorated agent runs
+_store_result: ContextVar[bool] = ContextVar("semantic_cache_store_result", default=True)
+
+
+def skip_store() -> None:
+    """Called from inside a ``semantic_cache`` agent: don't cache its current result."""
+    _store_result.set(False)
+
+
+def _read_bytes(path: str) -> bytes:
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return b""
+
+
+def _default_cacheable(result: Any) -> bool:
+    """Don't keep error payloads such as ``{"error": ...}``."""
+    return not (isinstance(result, dict) and "error" in result)
+
+
+def semantic_cache(
+    namespace: str,
+    text_arg: str | None = None,
+    image_arg: str | None = None,
+    threshold: float = 0.95,
+    ttl: float | None = None,
+    cacheable: Callable[[Any], bool] = _default_cacheable,
+):
+    """
+    Two-tier response cache for an ``async def`` agent.
+
+    Exact tier: SHA-256 of the image bytes (if any) and all other arguments.
+    Semantic tier: embedding of ``text_arg``, matched with cosine similarity
+    of at least ``threshold`` among entries with the same other arguments and
+    the same image hash, so an image-conditioned agent only reuses answers
+    for the very same image.
+
+    Args:
+        namespace (str): Cache file name, one per agent
+        text_arg (str): Argument embedded for the semantic tier (None: exact only)
+        image_arg (str): Argument holding an image path whose bytes are hashed
+        threshold (float): Minimum cosine similarity for a semantic hit
+        ttl (float): Seconds an entry stays valid (None: forever)
+        cacheable (callable): Predicate deciding whether a result is stored
+            (the agent can also opt out per call with ``skip_store()``)
+
+    Returns:
+        callable: Decorator
+    """
+    exact = _ExactTier(namespace)
+    similar = SemanticCache(threshold=threshold)
+    loaded = False
+
+    def warm_up():
+        """Embed all persisted entries in one batch for the semantic tier."""
+        nonlocal loaded
+        if text_arg is not None:
+            entries = [e for e in exact.entries().values() if ttl is None or time.time() - e["created"] <= ttl]
+            embeddings = embed([e["text"] for e in entries]) if entries else None
+            if embeddings is not None:
+                for entry, embedding in zip(entries, embeddings):
+                    similar.add(embedding[None, :], entry["text"], entry["scope"], entry["result"])
+        # Only after success, so a failed warm-up is retried on the next call
+        loaded = True
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not _enabled():
+                return await func(*args, **kwargs)
+
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+
+            image_hash = ""
+            if image_arg is not None:
+                image_bytes = await asyncio.to_thread(_read_bytes, arguments.pop(image_arg))
+                image_hash = hashlib.sha256(image_bytes).hexdigest()
+            text = arguments.pop(text_arg) if text_arg is not None else ""
+
+            # Everything except the embedded text must match for either tier
+            scope = hashlib.sha256(
+                orjson.dumps([namespace, image_hash, arguments], option=orjson.OPT_SORT_KEYS, default=str)
+            ).hexdigest()
+            key = hashlib.sha256((scope + text).encode("utf-8")).hexdigest()
+
+            entry = exact.get(key, ttl)
+            if entry is not None:
+                print(f"🗄️ {namespace}: exact cache hit")
+                return entry["result"]
+
+            # The semantic tier is best-effort: any failure in it is a miss
+            embedding = None
+            try:
+                if not loaded:
+                    await asyncio.to_thread(warm_up)
+                if text_arg is not None:
+                    embedding = await asyncio.to_thread(embed, [text])
+                    result = similar.search(embedding, scope)
+                    if result is not None:
+                        return result
+            except Exception as e:
+                print(f"⚠️ {namespace}: semantic cache unavailable ({e})")
+                embedding = None
+
+            token = _store_result.set(True)
+            try:
+                result = await func(*args, **kwargs)
+                store = _store_result.get()
+            finally:
+                _store_result.reset(token)
+            if store and cacheable(result):
+                try:
+                    exact.set(key, {"created": time.time(), "text": text, "scope": scope, "result": result})
+                except TypeError:  # Not JSON-serializable (e.g. SDK message objects)
+                    return result
+                try:
+                    similar.add(embedding, text, scope, result)
+                except Exception as e:
+                    print(f"⚠️ {namespace}: semantic cache unavailable ({e})")
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,14 +1,15 @@
+import asyncio
+import functools
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from dotenv import load_dotenv
-import anthropic
 
-# Load environment variables
-load_dotenv()
+import clients
 
-# Initialize Anthropic client
-client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+client = clients.ANTHROPIC
 
 # ============================================================================
 # SECTION 3: Build your first tool
@@ -21,15 +22,133 @@ def get_current_time():
     return datetime.now().strftime("%H:%M:%S")
 
 
-# Test the function
-print("Testing get_current_time():")
-print(get_current_time())
-print()
-
 # ============================================================================
 # SECTION 3.2: Using the tool with Claude
 # ============================================================================
 
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second on average, bursts
+    of up to `burst`. `acquire()` blocks until a token is available.
+    """
+    
+    def __init__(self, rate=5.0, burst=10):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve a token now; a deficit is slept off outside the lock
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+
+# Smooths bursts of API calls (e.g. the concurrent examples) below the rate limit
+_rate_limiter = TokenBucket(rate=5.0, burst=10)
+
+_EPHEMERAL = {"type": "ephemeral"}
+_ANCHOR_DISTANCE = 6  # Messages between the latest turn and the anchor breakpoint
+
+
+_COMPACT_AFTER = 8  # Conversation length from which old tool results are compacted
+_SUMMARY_CHARS = 200
+
+
+def _anchor_limit(message_count):
+    """Latest index the anchor breakpoint may sit at (moves in steps of _ANCHOR_DISTANCE)."""
+    return (message_count - 1 - _ANCHOR_DISTANCE) // _ANCHOR_DISTANCE * _ANCHOR_DISTANCE
+
+
+def _compact_history(messages):
+    """
+    Shrink stale tool results and images so later turns re-send fewer tokens.
+    
+    Only messages before the anchor breakpoint are touched: they are well
+    behind the latest turns, and since the anchor moves in steps the
+    compacted prefix changes once per step instead of every turn, so the
+    prompt cache keeps hitting.
+    """
+    if len(messages) <= _COMPACT_AFTER:
+        return
+    
+    tool_names = {}
+    for message in messages:
+        if message["role"] == "assistant" and not isinstance(message["content"], str):
+            for block in message["content"]:
+                if getattr(block, "type", None) == "tool_use":
+                    tool_names[block.id] = block.name
+    
+    for message in messages[:_anchor_limit(len(messages))]:
+        if message["role"] != "user" or isinstance(message["content"], str):
+            continue
+        for i, block in enumerate(message["content"]):
+            if block["type"] == "image":
+                message["content"][i] = {"type": "text", "text": "[image omitted]"}
+            elif block["type"] == "tool_result" and len(str(block["content"])) > _SUMMARY_CHARS:
+                name = tool_names.get(block["tool_use_id"], "tool")
+                summary = f"[tool_result truncated: {name} returned {len(str(block['content']))} chars] "
+                block["content"] = summary + str(block["content"])[:max(0, _SUMMARY_CHARS - len(summary))]
+
+
+def _ensure_cache_breakpoints(messages):
+    """
+    Place prompt-cache breakpoints on the conversation before each request.
+    
+    Breakpoints from earlier turns are removed, then two are set: one on the
+    latest user message (the prefix the next turn extends) and an anchor at
+    least _ANCHOR_DISTANCE messages back. The anchor only moves in steps of
+    _ANCHOR_DISTANCE, so it stays put across turns and a long tool loop keeps
+    hitting the same cached prefix. Together with the tools
+    breakpoint this stays within the API limit of 4.
+    """
+    user_indices = []
+    for i, message in enumerate(messages):
+        if message["role"] != "user":
+            continue
+        if isinstance(message["content"], str):
+            message["content"] = [{"type": "text", "text": message["content"]}]
+        for block in message["content"]:
+            block.pop("cache_control", None)
+        user_indices.append(i)
+    
+    targets = {user_indices[-1]}
+    limit = _anchor_limit(len(messages))
+    anchor = next((i for i in reversed(user_indices) if i <= limit), None)
+    if anchor is not None:
+        targets.add(anchor)
+    for i in targets:
+        messages[i]["content"][-1]["cache_control"] = _EPHEMERAL
+
+
+_marked_tools = {}
+
+
+def _cache_marked_tools(tools_list):
+    """
+    Tool list with a prompt-cache breakpoint on its last definition (which
+    caches the whole tool block), built once per set of schema dicts.
+    
+    The schemas are copied, so the caller's dicts are left untouched; the
+    originals are kept alive with the entry so their ids can't be reused.
+    """
+    if not tools_list:
+        return tools_list
+    key = tuple(id(tool) for tool in tools_list)
+    known = _marked_tools.get(key)
+    if known is None:
+        marked = [*tools_list[:-1], {**tools_list[-1], "cache_control": _EPHEMERAL}]
+        known = _marked_tools[key] = (list(tools_list), marked)
+    return known[1]
+
+
 def call_claude_with_tools(prompt, tools_list, model="claude-sonnet-4-20250514", max_iterations=5):
     """
     Call Claude with tools and handle tool use automatically.
@@ -46,62 +165,62 @@ def call_claude_with_tools(prompt, tools_list, model="claude-sonnet-4-20250514",
     messages = [{"role": "user", "content": prompt}]
     iteration = 0
     
+    tools_list = _cache_marked_tools(tools_list)
+    
     print(f"User: {prompt}\n")
     
     while iteration < max_iterations:
         iteration += 1
         
         # Call Claude
+        _compact_history(messages)
+        _ensure_cache_breakpoints(messages)
+        _rate_limiter.acquire()
         response = client.messages.create(
             model=model,
             max_tokens=4096,
             tools=tools_list,
             messages=messages
         )
+        cache_read = getattr(response.usage, "cache_read_input_tokens", 0) or 0
+        if cache_read:
+            print(f"   🧊 prompt cache: {cache_read} of {cache_read + response.usage.input_tokens} input tokens read from cache")
         
         # Check if Claude wants to use a tool
         if response.stop_reason == "tool_use":
-            # Extract tool use
-            tool_use_block = None
-            for block in response.content:
-                if block.type == "tool_use":
-                    tool_use_block = block
-                    break
+            # Extract every tool use (Claude may ask for several at once)
+            tool_uses = [block for block in response.content if block.type == "tool_use"]
+            
+            for tool_use_block in tool_uses:
+                print(f"🔧 Claude wants to use tool: {tool_use_block.name}")
+                print(f"   With input: {tool_use_block.input}")
             
-            if tool_use_block:
-                tool_name = tool_use_block.name
-                tool_input = tool_use_block.input
-                
-                print(f"🔧 Claude wants to use tool: {tool_name}")
-                print(f"   With input: {tool_input}")
-                
-                # Execute the tool locally
-                tool_result = execute_tool(tool_name, tool_input)
+            # Execute the tools locally, results kept in request order
+            tool_results = _execute_tools(tool_uses)
+            for tool_result in tool_results:
                 print(f"   Tool result: {tool_result}\n")
-                
-                # Add assistant's response to messages
-                messages.append({
-                    "role": "assistant",
-                    "content": response.content
-                })
-                
-                # Add tool result to messages
-                messages.append({
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "tool_result",
-                            "tool_use_id": tool_use_block.id,
-                            "content": str(tool_result)
-                        }
-                    ]
-                })
+            
+            # Add assistant's response to messages
+            messages.append({
+                "role": "assistant",
+                "content": response.content
+            })
+            
+            # Add all tool results to messages in one user turn
+            messages.append({
+                "role": "user",
+                "content": [
+                    {
+                        "type": "tool_result",
+                        "tool_use_id": tool_use_block.id,
+                        "content": str(tool_result)
+                    }
+                    for tool_use_block, tool_result in zip(tool_uses, tool_results)
+                ]
+            })
         else:
             # No more tool use, extract final response
-            final_text = ""
-            for block in response.content:
-                if hasattr(block, "text"):
-                    final_text += block.text
+            final_text = clients.response_text(response.content)
             
             print(f"Claude: {final_text}\n")
             return final_text, messages
@@ -109,6 +228,27 @@ def call_claude_with_tools(prompt, tools_list, model="claude-sonnet-4-20250514",
     return "Max iterations reached", messages
 
 
+# Tools that touch the filesystem; a turn using any of them runs sequentially
+# so its writes happen in the order Claude asked for them
+_SIDE_EFFECT_TOOLS = {"write_txt_file": True, "generate_qr_code": True}
+
+_TOOL_WORKERS = int(os.getenv("TOOL_CONCURRENCY_LIMIT", "4"))
+_tool_executor = ThreadPoolExecutor(max_workers=_TOOL_WORKERS)
+
+
+def _execute_tools(tool_uses):
+    """
+    Run the tool_use blocks of one turn, concurrently when they are independent.
+    
+    Returns:
+        list: One result per block, in the same order
+    """
+    calls = [(block.name, block.input) for block in tool_uses]
+    if len(calls) < 2 or any(_SIDE_EFFECT_TOOLS.get(name, False) for name, _ in calls):
+        return [execute_tool(name, tool_input) for name, tool_input in calls]
+    return list(_tool_executor.map(lambda call: execute_tool(*call), calls))
+
+
 def execute_tool(tool_name, tool_input):
     """
     Execute a tool function based on its name and input parameters.
@@ -140,37 +280,105 @@ time_tool = {
     }
 }
 
-# Test with Claude
-print("=" * 80)
-print("EXAMPLE 1: Getting the current time")
-print("=" * 80)
-response_text, conversation = call_claude_with_tools(
-    "What time is it?",
-    [time_tool]
-)
-
 # ============================================================================
 # SECTION 4: Additional Tools
 # ============================================================================
 
+_HTTP_TIMEOUT = (2, 5)  # (connect, read) seconds
+
+
+@functools.lru_cache(maxsize=1)
+def _http_session():
+    """Keep-alive session (small pool, two retries) shared by the web tools."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _ttl_cache(seconds):
+    """Memoize a function per arguments for `seconds` (errors are not cached)."""
+    def decorator(func):
+        entries = {}
+        
+        @functools.wraps(func)
+        def wrapper(*args):
+            hit = entries.get(args)
+            if hit is not None and time.monotonic() < hit[1]:
+                return hit[0]
+            value = func(*args)
+            entries[args] = (value, time.monotonic() + seconds)
+            return value
+        
+        return wrapper
+    return decorator
+
+
+_last_city = None  # Outlives the city cache entry, used to speculate
+_weather_executor = ThreadPoolExecutor(max_workers=2)
+
+
+# The machine's city rarely changes, the weather only within the hour
+@_ttl_cache(3600)
+def _current_city():
+    """City of this machine's public IP."""
+    global _last_city
+    ip_response = _http_session().get('https://ipapi.co/json/', timeout=_HTTP_TIMEOUT)
+    ip_response.raise_for_status()
+    location_data = ip_response.json()
+    if not location_data.get('city'):
+        # Rate-limited lookups come back as 200 with an error body
+        raise ValueError(location_data.get('reason', 'IP lookup returned no city'))
+    _last_city = location_data['city']
+    return _last_city
+
+
+@_ttl_cache(600)
+def _current_weather(city):
+    """Short weather description for `city` (using wttr.in as a simple weather API)."""
+    weather_response = _http_session().get(f'https://wttr.in/{city}?format=%C+%t', timeout=_HTTP_TIMEOUT)
+    weather_response.raise_for_status()
+    return weather_response.text.strip()
+
+
 def get_weather_from_ip():
     """Get weather information based on IP address location."""
-    import requests
     try:
+        # Fetch the weather for the last known city while the IP lookup runs;
+        # it is only discarded if the machine has moved
+        guess = _last_city
+        speculative = _weather_executor.submit(_current_weather, guess) if guess is not None else None
+        
         # Get location from IP
-        ip_response = requests.get('https://ipapi.co/json/')
-        location_data = ip_response.json()
-        city = location_data.get('city', 'Unknown')
+        city = _current_city()
         
-        # Get weather (using wttr.in as a simple weather API)
-        weather_response = requests.get(f'https://wttr.in/{city}?format=%C+%t')
-        weather_info = weather_response.text.strip()
+        # Get weather
+        if city == guess:
+            weather_info = speculative.result()
+        else:
+            weather_info = _current_weather(city)
         
         return f"Weather in {city}: {weather_info}"
     except Exception as e:
         return f"Could not fetch weather: {str(e)}"
 
 
+def _txt_path(filename):
+    """Ensure filename ends with .txt"""
+    return filename if filename.endswith('.txt') else filename + '.txt'
+
+
+def _sync_write(path, content):
+    # Encoded once and written as bytes, skipping the text-mode encoder layer
+    with open(path, 'wb') as f:
+        f.write(content.encode('utf-8'))
+
+
 def write_txt_file(filename, content):
     """Write content to a text file.
     
@@ -178,12 +386,16 @@ def write_txt_file(filename, content):
         filename: Name of the file to create (should end in .txt)
         content: Text content to write to the file
     """
-    # Ensure filename ends with .txt
-    if not filename.endswith('.txt'):
-        filename += '.txt'
+    filename = _txt_path(filename)
+    _sync_write(filename, content)
     
-    with open(filename, 'w') as f:
-        f.write(content)
+    return f"Successfully wrote content to {filename}"
+
+
+async def awrite_txt_file(filename, content):
+    """Async write_txt_file: open+write+close run as one worker-thread call."""
+    filename = _txt_path(filename)
+    await asyncio.to_thread(_sync_write, filename, content)
     
     return f"Successfully wrote content to {filename}"
 
@@ -196,15 +408,30 @@ def generate_qr_code(data, filename, image_path):
         filename: Name for the output PNG file (without extension)
         image_path: Path to the image to be used in the QR code
     """
+    import numpy as np
     import qrcode
-    from qrcode.image.styledpil import StyledPilImage
+    from PIL import Image
     
     qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_H)
     qr.add_data(data)
+    qr.make(fit=True)
+    
+    # Render all modules at once from the boolean matrix (border included)
+    # instead of drawing them one by one: dark modules 0, light 255
+    modules = np.array(qr.get_matrix(), dtype=np.uint8)
+    pixels = ((1 - modules) * 255).repeat(qr.box_size, axis=0).repeat(qr.box_size, axis=1)
+    img = Image.fromarray(pixels).convert("RGB")
+    
+    # Embed the logo in the center at a quarter of the width, like StyledPilImage
+    # (ERROR_CORRECT_H keeps the code readable under it)
+    logo_size = img.width // 4
+    offset = (img.width - logo_size) // 2
+    with Image.open(image_path) as logo:
+        logo = logo.convert("RGBA").resize((logo_size, logo_size), Image.LANCZOS)
+    img.paste(logo, (offset, offset), mask=logo)
     
-    img = qr.make_image(image_factory=StyledPilImage, embedded_image_path=image_path)
     output_file = f"{filename}.png"
-    img.save(output_file)
+    img.save(output_file, format="PNG", compress_level=1)
     
     return f"QR code saved as {output_file} containing: {data[:50]}..."
 
@@ -275,50 +502,75 @@ all_tools = [
 # EXAMPLES: Using the tools
 # ============================================================================
 
-print("\n" + "=" * 80)
-print("EXAMPLE 2: Getting weather")
-print("=" * 80)
-response_text, _ = call_claude_with_tools(
-    "Can you get the weather for my location?",
-    all_tools
-)
-
-print("\n" + "=" * 80)
-print("EXAMPLE 3: Writing a text file")
-print("=" * 80)
-response_text, _ = call_claude_with_tools(
-    "Can you make a txt note for me called reminders.txt that reminds me to call Daniel tomorrow at 7PM?",
-    all_tools
-)
-
-# Verify the file was created
-try:
-    with open('reminders.txt', 'r') as file:
-        contents = file.read()
-        print(f"\n📄 Contents of reminders.txt:\n{contents}")
-except FileNotFoundError:
-    print("\n⚠️ File was not created")
-
-print("\n" + "=" * 80)
-print("EXAMPLE 4: Generating QR code")
-print("=" * 80)
-print("Note: This example requires 'dl_logo.jpg' to exist in the current directory")
-print("If you don't have this file, the tool will fail but Claude will handle it gracefully")
-
-response_text, _ = call_claude_with_tools(
-    "Can you make a QR code for me using my company's logo that goes to www.deeplearning.ai? The logo is located at `dl_logo.jpg`. You can call it dl_qr_code.",
-    all_tools
-)
-
-print("\n" + "=" * 80)
-print("EXAMPLE 5: Using multiple tools")
-print("=" * 80)
-response_text, _ = call_claude_with_tools(
-    "Can you help me create a qr code that goes to www.deeplearning.com from the image dl_logo.jpg? Also write me a txt note with the current weather please.",
-    all_tools,
-    max_iterations=10
-)
-
-print("\n" + "=" * 80)
-print("✅ Lab complete! All examples executed.")
-print("=" * 80)
\ No newline at end of file
+def _example_header(number, title):
+    print("\n" + "=" * 80)
+    print(f"EXAMPLE {number}: {title}")
+    print("=" * 80)
+
+
+def _verify_reminders():
+    # Verify the file was created
+    try:
+        with open('reminders.txt', 'r') as file:
+            contents = file.read()
+            print(f"\n📄 Contents of reminders.txt:\n{contents}")
+    except FileNotFoundError:
+        print("\n⚠️ File was not created")
+
+
+async def _examples(max_concurrency=3):
+    """
+    Run the examples concurrently (at most `max_concurrency` at a time; the
+    token bucket paces their API calls), so their output interleaves.
+    Examples 3-5 write files (reminders.txt, the QR code, a weather note), so
+    they run one after another; only the read-only 1 and 2 run alongside them.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def run(number, title, prompt, tools_list, after=None, **kwargs):
+        async with semaphore:
+            _example_header(number, title)
+            await asyncio.to_thread(call_claude_with_tools, prompt, tools_list, **kwargs)
+            if after is not None:
+                after()
+    
+    async def file_writing_examples():
+        await run(
+            3, "Writing a text file",
+            "Can you make a txt note for me called reminders.txt that reminds me to call Daniel tomorrow at 7PM?",
+            all_tools,
+            after=_verify_reminders
+        )
+        await run(
+            4, "Generating QR code",
+            "Can you make a QR code for me using my company's logo that goes to www.deeplearning.ai? The logo is located at `dl_logo.jpg`. You can call it dl_qr_code.",
+            all_tools
+        )
+        await run(
+            5, "Using multiple tools",
+            "Can you help me create a qr code that goes to www.deeplearning.com from the image dl_logo.jpg? Also write me a txt note with the current weather please.",
+            all_tools,
+            max_iterations=10
+        )
+    
+    print("Note: Examples 4 and 5 require 'dl_logo.jpg' to exist in the current directory")
+    print("If you don't have this file, the tool will fail but Claude will handle it gracefully")
+    
+    await asyncio.gather(
+        run(1, "Getting the current time", "What time is it?", [time_tool]),
+        run(2, "Getting weather", "Can you get the weather for my location?", all_tools),
+        file_writing_examples(),
+    )
+
+
+if __name__ == "__main__":
+    # Test the function
+    print("Testing get_current_time():")
+    print(get_current_time())
+    print()
+    
+    asyncio.run(_examples())
+    
+    print("\n" + "=" * 80)
+    print("✅ Lab complete! All examples executed.")
+    print("=" * 80)
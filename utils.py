@@ -3,9 +3,52 @@ utils.py
 Helper utility functions for the agentic AI project
 """
 
+import io
 import json
+import re
+import sys
 from typing import Any
 
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the stdlib encoder
+    orjson = None
+
+# Compiled once at import, shared by every extract_urls call
+_URL_RE = re.compile(r'https?://[^\s\]\)>\}]+', flags=re.IGNORECASE)
+
+_BAR = "=" * 80
+_RULE = "-" * 80
+
+_COUNT_WINDOW = 1 << 16  # Characters split at a time by count_tokens_estimate
+
+
+def _write_text_content(buf: io.StringIO, content: str) -> None:
+    buf.write(truncate_text(content, 500))
+    buf.write("\n")
+
+
+def _write_block_content(buf: io.StringIO, content: list) -> None:
+    for item in content:
+        if isinstance(item, dict):
+            buf.write(format_json(item)[:300])
+            buf.write("\n")
+
+
+def _write_other_content(buf: io.StringIO, content: Any) -> None:
+    # Subclasses of str/list miss the exact-type table below
+    if isinstance(content, str):
+        _write_text_content(buf, content)
+    elif isinstance(content, list):
+        _write_block_content(buf, content)
+    else:
+        buf.write(str(content)[:500])
+        buf.write("\n")
+
+
+# Message content writers by exact type: one dict lookup per message
+_CONTENT_WRITERS = {str: _write_text_content, list: _write_block_content}
+
 
 def pretty_print_messages(messages: list):
     """
@@ -14,27 +57,20 @@ def pretty_print_messages(messages: list):
     Args:
         messages: List of message dictionaries
     """
-    print("\n" + "=" * 80)
-    print("CONVERSATION HISTORY")
-    print("=" * 80)
+    # Built in memory and written once, instead of one locked write per line
+    buf = io.StringIO()
+    buf.write(f"\n{_BAR}\nCONVERSATION HISTORY\n{_BAR}\n")
     
     for i, msg in enumerate(messages, 1):
         role = msg.get("role", "unknown")
         content = msg.get("content", "")
         
-        print(f"\n[{i}] Role: {role.upper()}")
-        print("-" * 80)
+        buf.write(f"\n[{i}] Role: {role.upper()}\n{_RULE}\n")
         
-        if isinstance(content, str):
-            print(content[:500] + ("..." if len(content) > 500 else ""))
-        elif isinstance(content, list):
-            for item in content:
-                if isinstance(item, dict):
-                    print(json.dumps(item, indent=2)[:300])
-        else:
-            print(str(content)[:500])
+        _CONTENT_WRITERS.get(type(content), _write_other_content)(buf, content)
     
-    print("\n" + "=" * 80)
+    buf.write(f"\n{_BAR}\n")
+    sys.stdout.write(buf.getvalue())
 
 
 def format_json(data: Any, indent: int = 2) -> str:
@@ -48,6 +84,9 @@ def format_json(data: Any, indent: int = 2) -> str:
     Returns:
         Formatted JSON string
     """
+    # orjson only knows 2-space indentation; its output matches json.dumps there
+    if orjson is not None and indent == 2:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
     return json.dumps(data, indent=indent, ensure_ascii=False)
 
 
@@ -62,9 +101,7 @@ def truncate_text(text: str, max_length: int = 500) -> str:
     Returns:
         Truncated text
     """
-    if len(text) <= max_length:
-        return text
-    return text[:max_length] + "..."
+    return text if len(text) <= max_length else f"{text[:max_length]}..."
 
 
 def extract_urls(text: str) -> list[str]:
@@ -77,9 +114,7 @@ def extract_urls(text: str) -> list[str]:
     Returns:
         List of URLs
     """
-    import re
-    url_pattern = re.compile(r'https?://[^\s\]\)>\}]+', flags=re.IGNORECASE)
-    return url_pattern.findall(text)
+    return _URL_RE.findall(text)
 
 
 def count_tokens_estimate(text: str) -> int:
@@ -92,5 +127,15 @@ def count_tokens_estimate(text: str) -> int:
     Returns:
         Estimated token count
     """
-    words = len(text.split())
+    if len(text) <= _COUNT_WINDOW:
+        return int(len(text.split()) * 1.3)
+    
+    # Large inputs: split one window at a time so the scratch word list stays
+    # bounded; a word cut by a window edge would be counted twice
+    words = 0
+    for start in range(0, len(text), _COUNT_WINDOW):
+        end = start + _COUNT_WINDOW
+        words += len(text[start:end].split())
+        if end < len(text) and not text[end - 1].isspace() and not text[end].isspace():
+            words -= 1
     return int(words * 1.3)
\ No newline at end of file